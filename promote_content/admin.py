@@ -1,11 +1,39 @@
 from django.contrib import admin
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
 
 from .models import Curation
 
 from genericadmin.admin import GenericAdminModelAdmin, GenericTabularInline, GenericStackedInline
 
 
+class CurationStatusListFilter(admin.SimpleListFilter):
+    title = _('status')
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('active', _('Active')),
+            ('scheduled', _('Scheduled')),
+            ('expired', _('Expired')),
+        )
+
+    def queryset(self, request, queryset):
+        now = timezone.now()
+        if self.value() == 'active':
+            return queryset.filter(Q(start__lte=now) | Q(start__isnull=True),
+                                   Q(end__gte=now) | Q(end__isnull=True))
+        if self.value() == 'scheduled':
+            return queryset.filter(start__gt=now)
+        if self.value() == 'expired':
+            return queryset.filter(end__lt=now)
+
+
 class CurateAdmin(GenericAdminModelAdmin):
+    list_display = ('content_object', 'context_object', 'weight', 'start', 'end')
+    list_filter = (CurationStatusListFilter, 'content_type')
+
     generic_fk_fields = [{
         'ct_field': 'context_type',
         'fk_field': 'context_id',
@@ -14,6 +42,11 @@ class CurateAdmin(GenericAdminModelAdmin):
         'ct_field': 'content_type',
         'fk_field': 'content_id',
     }]
+
+    def queryset(self, request):
+        # fetch the curated and context objects of a page with one query per
+        # content type rather than two queries per curation
+        return super(CurateAdmin, self).queryset(request).prefetch_related('content_object', 'context_object')
 admin.site.register(Curation, CurateAdmin)
 
 
@@ -0,0 +1,101 @@
+import itertools
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Curation, use_active_promotions
+from .signals import curations_changed
+from .utils import get_content_type
+
+
+# default of arguments that are left unchanged when not passed
+UNCHANGED = object()
+
+
+def _context_filter(contexts):
+    if contexts is None:
+        return Q(context_type__isnull=True)
+    return reduce(operator.or_, [
+        Q(context_type=get_content_type(context), context_id=context.pk)
+        for context in contexts
+    ], Q(pk__in=[]))
+
+
+def curations_for(objects, contexts=None):
+    """
+    Returns a queryset of the curations of ``objects`` within ``contexts``,
+    or of those without a context when no contexts are supplied, with one
+    condition per content type
+    """
+    key = lambda obj: get_content_type(obj).pk
+    objects_filter = Q(pk__in=[])
+    for content_type_id, group in itertools.groupby(sorted(objects, key=key), key):
+        objects_filter |= Q(content_type=content_type_id,
+                            content_id__in=[obj.pk for obj in group])
+    return Curation.objects.filter(objects_filter).filter(_context_filter(contexts))
+
+
+def promote(objects, contexts=None, weight=0, start=None, end=None, batch_size=None):
+    """
+    Creates a curation of each of ``objects`` in each of ``contexts`` (or
+    without a context) using a single query per batch
+    """
+    objects = list(objects)
+    curations = []
+    for obj in objects:
+        for context in (contexts or [None]):
+            curations.append(Curation(
+                content_type=get_content_type(obj),
+                content_id=obj.pk,
+                context_type=context is not None and get_content_type(context) or None,
+                context_id=context is not None and context.pk or None,
+                weight=weight,
+                start=start,
+                end=end,
+            ))
+    Curation.objects.bulk_create(curations, batch_size=batch_size)
+    curations_changed.send(sender=Curation, queryset=curations_for(objects, contexts or None))
+    return curations
+
+
+def _update(curations, **kwargs):
+    if use_active_promotions():
+        # the updated curations may no longer match the queryset they are
+        # synchronised from
+        curations = Curation.objects.using(curations.db).filter(
+            pk__in=list(curations.values_list('pk', flat=True)))
+    count = curations.update(**kwargs)
+    curations_changed.send(sender=Curation, queryset=curations)
+    return count
+
+
+def reweight(curations, weight):
+    """
+    Sets the weight of every curation in the ``curations`` queryset
+    """
+    return _update(curations, weight=weight)
+
+
+def reschedule(curations, start=UNCHANGED, end=UNCHANGED):
+    """
+    Sets the start and/or end of every curation in the ``curations``
+    queryset, leaving the one that isn't passed unchanged. None removes
+    the bound.
+    """
+    kwargs = dict((name, value) for name, value in (('start', start), ('end', end))
+                  if value is not UNCHANGED)
+    if not kwargs:
+        raise TypeError("reschedule() requires a start or an end")
+    return _update(curations, **kwargs)
+
+
+def expire(curations, now=None):
+    """
+    Ends every curation in the ``curations`` queryset that has not already
+    ended
+    """
+    if now is None:
+        now = timezone.now()
+    return _update(curations.filter(Q(end__gt=now) | Q(end__isnull=True)), end=now)
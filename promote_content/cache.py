@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+
+from . import instrumentation
+from .models import Curation, get_curation_source
+from .signals import curations_changed
+from .utils import get_content_type, get_now
+
+
+VERSION_KEY = 'promote_content:version'
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def get_version(cache, key):
+    """
+    Returns the version stored in ``cache`` under ``key``, storing a new one
+    if it is missing
+    """
+    version = cache.get(key)
+    if version is None:
+        # start from the current time so that a lost version key can't
+        # bring back entries stored under an earlier version
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), VERSION_TIMEOUT)
+
+
+class SharedCurationCache(object):
+    """
+    Curation weights shared between processes through one of the caches
+    configured in CACHES. Keys are versioned, and the version is bumped
+    whenever a curation changes so that stale entries are never read.
+    """
+
+    def __init__(self):
+        self._caches = {}
+
+    @property
+    def cache(self):
+        alias = getattr(settings, 'PROMOTE_CONTENT_CACHE_ALIAS', None)
+        if alias is None:
+            return None
+        if alias not in self._caches:
+            self._caches[alias] = get_cache(alias)
+        return self._caches[alias]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'PROMOTE_CONTENT_CACHE_TIMEOUT', 300)
+
+    def get_version(self):
+        return get_version(self.cache, VERSION_KEY)
+
+    def bump_version(self):
+        bump_version(self.cache, VERSION_KEY)
+
+    def _make_key(self, key, version):
+        return 'promote_content:curations:%s:%s' % (version, ':'.join(map(str, key)))
+
+    def get(self, key, version, now):
+        entry = self.cache.get(self._make_key(key, version))
+        if entry is not None:
+            weights, expires = entry
+            if expires is None or now < expires:
+                return entry
+
+    def set(self, key, version, now, weights, expires):
+        timeout = self.timeout
+        if expires is not None:
+            # align the timeout with the next start or end
+            delta = expires - now
+            seconds = delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+            timeout = min(timeout, int(math.ceil(seconds)))
+        if timeout > 0:
+            self.cache.set(self._make_key(key, version), (weights, expires), timeout)
+
+
+class ActiveCurationCache(object):
+    """
+    Process local cache of the curations active for a content type and
+    context. Entries expire at the next start or end among the curations
+    they were built from and are cleared whenever a curation changes.
+
+    When PROMOTE_CONTENT_CACHE_ALIAS names a cache, entries are shared
+    between processes through it and local entries are only used while the
+    shared version is unchanged.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.shared = SharedCurationCache()
+
+    def _get_key(self, model, context):
+        content_type = get_content_type(model)
+        if context is None:
+            return (content_type.pk, None, None)
+        return (content_type.pk, get_content_type(context).pk, context.pk)
+
+    def _load(self, key, now):
+        """
+        Returns the active weights and the time at which they expire
+        """
+        content_type_id, context_type_id, context_id = key
+        curations = get_curation_source().objects.filter(
+            Q(end__gte=now) | Q(end__isnull=True),
+            content_type=content_type_id,
+            context_type=context_type_id,
+            context_id=context_id,
+        ).values_list('content_id', 'weight', 'start', 'end')
+
+        weights = {}
+        expires = None
+        for content_id, weight, start, end in curations:
+            if start is not None and start > now:
+                boundary = start
+            else:
+                # keep the greatest weight of overlapping curations
+                weights[content_id] = max(weight, weights.get(content_id, weight))
+                boundary = end
+            if boundary is not None and (expires is None or boundary < expires):
+                expires = boundary
+        return weights, expires
+
+    def get(self, model, context=None, now=None):
+        """
+        Returns a dictionary mapping the pk of each curated instance of
+        ``model`` in ``context`` to its curation weight
+        """
+        return self._get_entry(model, context, now)[0]
+
+    def get_expires(self, model, context=None, now=None):
+        """
+        Returns the time of the next start or end among the curations of
+        ``model`` in ``context``, when the active curations next change, or
+        None if they never will
+        """
+        return self._get_entry(model, context, now)[1]
+
+    def _get_entry(self, model, context, now):
+        if now is None:
+            now = get_now()
+        key = self._get_key(model, context)
+        version = self.shared.cache is not None and self.shared.get_version() or None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            weights, expires, entry_version = entry
+            if entry_version == version and (expires is None or now < expires):
+                instrumentation.incr('cache.hits')
+                return weights, expires
+
+        generation = self._generation
+        entry = version is not None and self.shared.get(key, version, now) or None
+        if entry is not None:
+            instrumentation.incr('cache.shared_hits')
+            weights, expires = entry
+        else:
+            instrumentation.incr('cache.misses')
+            weights, expires = self._load(key, now)
+            if version is not None:
+                self.shared.set(key, version, now, weights, expires)
+
+        with self._lock:
+            # don't store weights loaded before the cache was last cleared
+            if generation == self._generation:
+                self._entries[key] = (weights, expires, version)
+        return weights, expires
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._generation += 1
+        if self.shared.cache is not None:
+            self.shared.bump_version()
+
+
+active_curations = ActiveCurationCache()
+
+
+def clear_active_curations(sender, **kwargs):
+    active_curations.clear()
+
+post_save.connect(clear_active_curations, sender=Curation)
+post_delete.connect(clear_active_curations, sender=Curation)
+curations_changed.connect(clear_active_curations, sender=Curation)
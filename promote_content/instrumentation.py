@@ -0,0 +1,109 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+
+class NullMetrics(object):
+    """
+    Metrics backend discarding everything it is given, used unless
+    PROMOTE_CONTENT_METRICS names another backend
+    """
+    enabled = False
+
+    def incr(self, name, count=1):
+        pass
+
+    def timing(self, name, value):
+        pass
+
+
+_null_metrics = NullMetrics()
+_backends = {}
+
+
+def get_metrics():
+    """
+    Returns the metrics backend named by PROMOTE_CONTENT_METRICS, a dotted
+    path to an object or class with statsd style ``incr(name, count)`` and
+    ``timing(name, milliseconds)`` methods
+    """
+    path = getattr(settings, 'PROMOTE_CONTENT_METRICS', None)
+    if path is None:
+        return _null_metrics
+    try:
+        return _backends[path]
+    except KeyError:
+        module_name, _, attr = path.rpartition('.')
+        try:
+            backend = getattr(import_module(module_name), attr)
+        except (ImportError, AttributeError, ValueError) as e:
+            raise ImproperlyConfigured("Error importing metrics backend %s: %s" % (path, e))
+        if isinstance(backend, type):
+            backend = backend()
+        _backends[path] = backend
+        return backend
+
+
+def _prefixed(name):
+    return "%s.%s" % (getattr(settings, 'PROMOTE_CONTENT_METRICS_PREFIX', 'promote_content'), name)
+
+
+def incr(name, count=1):
+    metrics = get_metrics()
+    if getattr(metrics, 'enabled', True):
+        metrics.incr(_prefixed(name), count)
+
+
+def timing(name, seconds):
+    metrics = get_metrics()
+    if getattr(metrics, 'enabled', True):
+        metrics.timing(_prefixed(name), seconds * 1000)
+
+
+class timer(object):
+    """
+    Context manager reporting the time spent within it as ``name``
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        timing(self.name, time.time() - self.start)
+
+
+def measure_rows(name, iterator):
+    """
+    Wraps an iterator over the rows of a query, reporting the time spent
+    fetching them as ``<name>.time`` and their number as ``<name>.rows``
+    once the iterator is exhausted or closed
+    """
+    if not getattr(get_metrics(), 'enabled', True):
+        return iterator
+    return _measure_rows(name, iterator)
+
+
+def _measure_rows(name, iterator):
+    elapsed = 0
+    rows = 0
+    incr("%s.queries" % name)
+    try:
+        while True:
+            start = time.time()
+            try:
+                obj = next(iterator)
+            finally:
+                elapsed += time.time() - start
+            rows += 1
+            yield obj
+    except StopIteration:
+        pass
+    finally:
+        timing("%s.time" % name, elapsed)
+        incr("%s.rows" % name, rows)
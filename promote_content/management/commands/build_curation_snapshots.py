@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from promote_content import snapshots
+
+
+class Command(BaseCommand):
+    args = '[name name ...]'
+    help = ("Builds the registered curation ranking snapshots, or only those named. "
+            "Run it on a schedule to keep snapshots available.")
+
+    def handle(self, *names, **options):
+        for name in names:
+            if name not in snapshots.registry:
+                raise CommandError("Unknown snapshot %r" % name)
+        for name in sorted(names or snapshots.registry):
+            count = snapshots.registry[name].build()
+            if int(options.get('verbosity', 1)) > 0:
+                self.stdout.write("%s: %s instances\n" % (name, count))
@@ -0,0 +1,23 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from promote_content.models import ActivePromotion
+
+
+class Command(NoArgsCommand):
+    help = ("Removes promotions that have ended from the active promotion table, "
+            "or rebuilds the table from every curation that has not ended.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--rebuild', action='store_true', dest='rebuild', default=False,
+                    help='Rebuild the table rather than removing ended promotions.'),
+    )
+
+    def handle_noargs(self, **options):
+        if options['rebuild']:
+            ActivePromotion.objects.rebuild()
+        else:
+            ActivePromotion.objects.sweep()
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write("%s active promotions\n" % ActivePromotion.objects.count())
@@ -0,0 +1,94 @@
+import datetime
+import time
+from optparse import make_option
+
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.sql import DeleteQuery
+from django.utils import timezone
+
+from promote_content.models import ActivePromotion, Curation
+from promote_content.signals import curations_changed
+
+
+class Command(NoArgsCommand):
+    help = ("Deletes curations that have ended in batches, optionally archiving "
+            "them to a file, or reports how many would be deleted.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--days', action='store', dest='days', type='int', default=0,
+                    help='Only sweep curations that ended more than this many days ago.'),
+        make_option('--batch-size', action='store', dest='batch_size', type='int', default=1000,
+                    help='Number of curations deleted per query.'),
+        make_option('--sleep', action='store', dest='sleep', type='float', default=0,
+                    help='Seconds to sleep between batches.'),
+        make_option('--archive', action='store', dest='archive', default=None,
+                    help='Append each batch of curations to this file as JSON before deleting it.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Report the number of curations per model and context without deleting them.'),
+        make_option('--database', action='store', dest='database', default='default',
+                    help='Nominates a database to sweep.'),
+    )
+
+    def handle_noargs(self, **options):
+        using = options['database']
+        verbosity = int(options.get('verbosity', 1))
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        expired = Curation.objects.using(using).filter(end__lt=before)
+
+        if options['dry_run']:
+            self.report(expired)
+            return
+
+        archive = options['archive'] and open(options['archive'], 'a') or None
+        deleted = 0
+        try:
+            while True:
+                pks = list(expired.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+                if not pks:
+                    break
+                if archive is not None:
+                    archive.write(serializers.serialize('json', Curation.objects.using(using).filter(pk__in=pks)))
+                    archive.write("\n")
+                    archive.flush()
+                self.delete(pks, using)
+                deleted += len(pks)
+                if verbosity > 1:
+                    self.stdout.write("Deleted %s curations\n" % deleted)
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        finally:
+            if archive is not None:
+                archive.close()
+
+        if verbosity > 0:
+            self.stdout.write("Deleted %s curations that ended before %s\n" % (deleted, before))
+
+    def delete(self, pks, using):
+        """
+        Deletes a batch of curations and their active promotions with one
+        statement each, without sending post_delete for every curation, and
+        sends curations_changed once for the batch
+        """
+        with transaction.commit_on_success(using=using):
+            DeleteQuery(ActivePromotion).delete_batch(pks, using)
+            DeleteQuery(Curation).delete_batch(pks, using)
+        curations_changed.send(sender=Curation, queryset=Curation.objects.using(using).filter(pk__in=pks))
+
+    def report(self, expired):
+        rows = expired.values('content_type', 'context_type', 'context_id').annotate(
+            count=Count('pk')).order_by('content_type', 'context_type', 'context_id')
+        total = 0
+        name = lambda pk: "%s.%s" % ContentType.objects.get_for_id(pk).natural_key()
+        for row in rows:
+            content_type = name(row['content_type'])
+            if row['context_type'] is not None:
+                context = "%s %s" % (name(row['context_type']), row['context_id'])
+            else:
+                context = "no context"
+            self.stdout.write("%s (%s): %s\n" % (content_type, context, row['count']))
+            total += row['count']
+        self.stdout.write("%s curations would be deleted\n" % total)
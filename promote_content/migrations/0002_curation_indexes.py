@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding index on 'Curation', fields ['content_type', 'content_id', 'context_type', 'context_id']
+        db.create_index('promote_content_curation', ['content_type_id', 'content_id', 'context_type_id', 'context_id'])
+
+        # Adding index on 'Curation', fields ['context_type', 'context_id', 'content_type']
+        db.create_index('promote_content_curation', ['context_type_id', 'context_id', 'content_type_id'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'Curation', fields ['context_type', 'context_id', 'content_type']
+        db.delete_index('promote_content_curation', ['context_type_id', 'context_id', 'content_type_id'])
+
+        # Removing index on 'Curation', fields ['content_type', 'content_id', 'context_type', 'context_id']
+        db.delete_index('promote_content_curation', ['content_type_id', 'content_id', 'context_type_id', 'context_id'])
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'promote_content.curation': {
+            'Meta': {'object_name': 'Curation'},
+            'content_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'content'", 'to': "orm['contenttypes.ContentType']"}),
+            'context_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'context_type': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'contexts'", 'null': 'True', 'to': "orm['contenttypes.ContentType']"}),
+            'end': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'start': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'weight': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        }
+    }
+
+    complete_apps = ['promote_content']
\ No newline at end of file
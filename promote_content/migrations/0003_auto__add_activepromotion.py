@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'ActivePromotion'
+        db.create_table('promote_content_activepromotion', (
+            ('curation', self.gf('django.db.models.fields.related.OneToOneField')(related_name='active_promotion', unique=True, primary_key=True, to=orm['promote_content.Curation'])),
+            ('start', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('end', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('weight', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('context_type', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='+', null=True, to=orm['contenttypes.ContentType'])),
+            ('context_id', self.gf('django.db.models.fields.PositiveIntegerField')(null=True, blank=True)),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(related_name='+', to=orm['contenttypes.ContentType'])),
+            ('content_id', self.gf('django.db.models.fields.PositiveIntegerField')()),
+        ))
+        db.send_create_signal('promote_content', ['ActivePromotion'])
+
+        # Adding index on 'ActivePromotion', fields ['content_type', 'content_id', 'context_type', 'context_id']
+        db.create_index('promote_content_activepromotion', ['content_type_id', 'content_id', 'context_type_id', 'context_id'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'ActivePromotion', fields ['content_type', 'content_id', 'context_type', 'context_id']
+        db.delete_index('promote_content_activepromotion', ['content_type_id', 'content_id', 'context_type_id', 'context_id'])
+
+        # Deleting model 'ActivePromotion'
+        db.delete_table('promote_content_activepromotion')
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'promote_content.activepromotion': {
+            'Meta': {'object_name': 'ActivePromotion'},
+            'content_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'+'", 'to': "orm['contenttypes.ContentType']"}),
+            'context_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'context_type': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'to': "orm['contenttypes.ContentType']"}),
+            'curation': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'active_promotion'", 'unique': 'True', 'primary_key': 'True', 'to': "orm['promote_content.Curation']"}),
+            'end': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'start': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'weight': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        },
+        'promote_content.curation': {
+            'Meta': {'object_name': 'Curation'},
+            'content_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'content'", 'to': "orm['contenttypes.ContentType']"}),
+            'context_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'context_type': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'contexts'", 'null': 'True', 'to': "orm['contenttypes.ContentType']"}),
+            'end': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'start': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'weight': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        }
+    }
+
+    complete_apps = ['promote_content']
\ No newline at end of file
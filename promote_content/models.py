@@ -1,11 +1,16 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, connections, transaction
+from django.db.models.signals import post_save
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
+from django.utils import timezone
+
+from .signals import curations_changed
 
 
 class Curation(models.Model):
-    start = models.DateTimeField(null=True, blank=True)
-    end = models.DateTimeField(null=True, blank=True)
+    start = models.DateTimeField(null=True, blank=True, db_index=True)
+    end = models.DateTimeField(null=True, blank=True, db_index=True)
     weight = models.IntegerField(default=0)
 
     context_type = models.ForeignKey(ContentType, null=True, blank=True, related_name="contexts")
@@ -23,3 +28,134 @@ class Curation(models.Model):
         else:
             rel_str = "%s, " % self.content_object
         return rel_str + common_str
+
+
+class ActivePromotionManager(models.Manager):
+    def _copied_fields(self):
+        return [f for f in self.model._meta.fields if f.name != 'curation']
+
+    def sync(self, curation, now=None):
+        """
+        Copies ``curation`` into the table if it has not ended, otherwise
+        removes it
+        """
+        if now is None:
+            now = timezone.now()
+        if curation.end is not None and curation.end < now:
+            self.filter(curation=curation).delete()
+            return
+        fields = self._copied_fields()
+        if not self.filter(curation=curation).update(
+                **dict((f.name, getattr(curation, f.attname)) for f in fields)):
+            self.create(curation=curation, **dict((f.attname, getattr(curation, f.attname)) for f in fields))
+
+    def sync_many(self, curations, now=None):
+        """
+        Copies the curations of the ``curations`` queryset that have not
+        ended into the table and removes the others, using three queries
+        """
+        if now is None:
+            now = timezone.now()
+        pks = list(curations.values_list('pk', flat=True))
+        if not pks:
+            return
+        with transaction.commit_on_success(using=self.db):
+            self.filter(curation__in=pks).delete()
+            self._copy(now, pks)
+
+    def rebuild(self, now=None):
+        """
+        Replaces the contents of the table with every curation that has not
+        ended, using two queries
+        """
+        if now is None:
+            now = timezone.now()
+        with transaction.commit_on_success(using=self.db):
+            self.all().delete()
+            self._copy(now)
+
+    def _copy(self, now, pks=None):
+        """
+        Copies the curations that have not ended, or only those of them in
+        ``pks``, into the table with a single query
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        columns = [self.model._meta.pk.column] + [f.column for f in self._copied_fields()]
+        source_columns = [Curation._meta.pk.column] + [
+            Curation._meta.get_field(f.name).column for f in self._copied_fields()]
+        end = qn(Curation._meta.get_field('end').column)
+
+        sql = "INSERT INTO %s (%s) SELECT %s FROM %s WHERE (%s IS NULL OR %s >= %%s)" % (
+            qn(self.model._meta.db_table),
+            ", ".join(map(qn, columns)),
+            ", ".join(map(qn, source_columns)),
+            qn(Curation._meta.db_table),
+            end,
+            end,
+        )
+        params = [connection.ops.value_to_db_datetime(now)]
+        if pks is not None:
+            sql += " AND %s IN (%s)" % (qn(Curation._meta.pk.column), ", ".join(["%s"] * len(pks)))
+            params.extend(pks)
+        connection.cursor().execute(sql, params)
+
+    def sweep(self, now=None):
+        """
+        Removes the promotions that have ended
+        """
+        if now is None:
+            now = timezone.now()
+        self.filter(end__lt=now).delete()
+
+
+class ActivePromotion(models.Model):
+    """
+    Denormalised copy of the curations that have not ended, kept up to date
+    as curations change when PROMOTE_CONTENT_ACTIVE_PROMOTIONS is enabled.
+    Ended promotions are removed by the refresh_active_promotions command.
+    """
+    curation = models.OneToOneField(Curation, primary_key=True, related_name="active_promotion")
+
+    start = models.DateTimeField(null=True, blank=True)
+    end = models.DateTimeField(null=True, blank=True)
+    weight = models.IntegerField(default=0)
+
+    context_type = models.ForeignKey(ContentType, null=True, blank=True, related_name="+")
+    context_id = models.PositiveIntegerField(null=True, blank=True)
+
+    content_type = models.ForeignKey(ContentType, related_name="+")
+    content_id = models.PositiveIntegerField()
+
+    objects = ActivePromotionManager()
+
+
+def use_active_promotions():
+    return getattr(settings, 'PROMOTE_CONTENT_ACTIVE_PROMOTIONS', False)
+
+
+def get_curation_source():
+    """
+    Returns the model active curations are read from
+    """
+    return use_active_promotions() and ActivePromotion or Curation
+
+
+def sync_active_promotion(sender, instance, raw=False, **kwargs):
+    if use_active_promotions() and not raw:
+        ActivePromotion.objects.sync(instance)
+
+
+def sync_changed_promotions(sender, queryset=None, **kwargs):
+    if use_active_promotions():
+        if queryset is None:
+            ActivePromotion.objects.rebuild()
+        else:
+            ActivePromotion.objects.sync_many(queryset)
+
+post_save.connect(sync_active_promotion, sender=Curation)
+curations_changed.connect(sync_changed_promotions, sender=Curation)
+
+
+# connect the signal handlers that keep cached curations up to date
+from . import cache
@@ -0,0 +1,55 @@
+import sys
+import threading
+
+from django.db import connections, transaction
+from django.utils import six
+
+
+def can_run_in_threads(using):
+    """
+    Returns True if queries against ``using`` see the same data from any
+    thread, which isn't the case for in-memory SQLite databases, nor while
+    the current thread has uncommitted changes
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+        return False
+    return not transaction.is_dirty(using=using)
+
+
+def run_in_threads(funcs, using):
+    """
+    Calls each of ``funcs`` concurrently, each with its own connection to
+    ``using``, and returns their results in order. Falls back to calling
+    them in turn when the database can't be shared between threads.
+    """
+    if len(funcs) < 2 or not can_run_in_threads(using):
+        return [func() for func in funcs]
+
+    results = [None] * len(funcs)
+    errors = [None] * len(funcs)
+
+    def run(i, func):
+        try:
+            results[i] = func()
+        except Exception:
+            errors[i] = sys.exc_info()
+
+    def run_in_thread(i, func):
+        try:
+            run(i, func)
+        finally:
+            connections[using].close()
+
+    # the last function runs in the current thread, on its connection
+    threads = [threading.Thread(target=run_in_thread, args=(i, func)) for i, func in enumerate(funcs[:-1])]
+    for thread in threads:
+        thread.start()
+    run(len(funcs) - 1, funcs[-1])
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            six.reraise(*error)
+    return results
@@ -1,11 +1,31 @@
+import base64
 import itertools
+import json
 
-from django.db.models.query import QuerySet
-from django.db.models import Q
-from django.utils import timezone
-from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models.query import QuerySet, ValuesQuerySet, ValuesListQuerySet, CHUNK_SIZE
+from django.utils.datastructures import SortedDict
 
-from .models import Curation
+from . import instrumentation, parallel
+from .cache import active_curations
+from .models import Curation, get_curation_source
+from .utils import get_content_type, get_generic_relation, get_now
+
+
+def _encode_cursor(segment, values):
+    data = json.dumps([segment] + list(values))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor %r" % cursor)
+    if not isinstance(data, list) or not data or data[0] not in ('curated', 'uncurated'):
+        raise ValueError("Invalid cursor %r" % cursor)
+    return data[0], data[1:]
 
 
 class CuratedQuerySet(QuerySet):
@@ -18,112 +38,774 @@ class CuratedQuerySet(QuerySet):
         self._is_curated = False
         self._is_contextual = False
         self._curated_qs = []
+        self._curation_ordering = []
+        self._curation_base = None
+        self._curation_context = None
+        self._curated_count = None
+        self._curation_now = None
+        self._with_curation = False
+        self._curation_segment = None
+        self._concurrent = False
 
     def _clone(self, klass=None, setup=False, **kwargs):
         c = super(CuratedQuerySet, self)._clone(klass=klass, setup=setup, **kwargs)
         # persist _is_curated through cloning
         c._is_curated = self._is_curated
-        c._curated_qs = self._curated_qs
+        if self._is_curated:
+            # clones must not share the rows or count of the curated segment
+            c._curated_qs = self._curated_qs._clone()
+        else:
+            c._curated_qs = self._curated_qs
+        c._curation_ordering = self._curation_ordering
+        c._curation_base = self._curation_base
+        c._curation_context = self._curation_context
+        c._curation_now = self._curation_now
+        c._with_curation = self._with_curation
+        c._curation_segment = self._curation_segment
+        c._concurrent = self._concurrent
         return c
 
-    def _get_genericrelation_to(self, model, target):
-        gen_rels = model._meta.get_m2m_with_model()
-        for gen_rel in gen_rels:
-            if gen_rel[0].rel.to == target:
-                return gen_rel[0].name
+    def _get_genericrelation(self, model, target):
+        return get_generic_relation(model, target)
 
-    def curated(self, context=None):
+    def _get_ordering(self, query):
         """
-        Returns a queryset of instances
+        Returns a copy of the ordering that will be applied to the query
+        ordering priority taken from django.db.models.sql.compiler.get_ordering
         """
-        assert self.query.can_filter(), \
-            "Cannot reorder a query once a slice has been taken."
+        if query.extra_order_by:
+            ordering = query.extra_order_by
+        elif not query.default_ordering:
+            ordering = query.order_by
+        else:
+            ordering = (query.order_by
+                        or query.model._meta.ordering
+                        or [])
+        return list(ordering)
 
-        now = timezone.now()
+    def _active_curation_sql(self, select, context, now, order_by=None, correlated=True):
+        """
+        Returns sql and params for a subquery selecting from the curations
+        active at ``now`` for each row of the outer query, or from all of
+        them when ``correlated`` is False
 
-        curation_rel = self._get_genericrelation_to(self.model, Curation)
+        ``select`` and ``order_by`` may refer to the curated instance's pk as
+        ``%(content_id)s``, to the curation weight as
+        ``%(weight)s`` and, when ``context`` is a list of contexts, to the
+        position of the curation's context within it as ``%(rank)s``
 
-        start_lte = {"%s__start__lte" % curation_rel: now}
-        start_null = {"%s__start__isnull" % curation_rel: True}
-        end_gte = {"%s__end__gte" % curation_rel: now}
-        end_null = {"%s__end__isnull" % curation_rel: True}
+        ``context`` may also be a queryset of contexts, matched by a subquery
+        so that it is never evaluated on its own
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        curation_rel = self._get_genericrelation(self.model, Curation)
+        source = get_curation_source()
+        alias = qn('active_curation')
 
-        start_filter = Q(**start_lte) | Q(**start_null)
-        end_filter = Q(**end_gte) | Q(**end_null)
+        def column(name):
+            return "%s.%s" % (alias, qn(source._meta.get_field(name).column))
 
-        curated = self.filter(start_filter, end_filter)
+        now = connection.ops.value_to_db_datetime(now)
+        where = [
+            "%s = %%s" % column(curation_rel.content_type_field_name),
+            "(%s IS NULL OR %s <= %%s)" % (column('start'), column('start')),
+            "(%s IS NULL OR %s >= %%s)" % (column('end'), column('end')),
+        ]
+        if correlated:
+            where.insert(1, "%s = %s.%s" % (column(curation_rel.object_id_field_name),
+                                            qn(self.model._meta.db_table),
+                                            qn(self.model._meta.pk.column)))
+        params = [get_content_type(self.model).pk, now, now]
+        rank_sql, rank_params = "0", []
 
-        if context is not None:
+        if isinstance(context, list):
+            # include curation for any of the supplied contexts, ranked by
+            # the position of their context
+            context_sql = "(%s = %%s AND %s = %%s)" % (column('context_type'), column('context_id'))
+            context_params = []
+            for c in context:
+                context_params.extend([get_content_type(c).pk, c.pk])
+            where.append("(%s)" % " OR ".join([context_sql] * len(context) or ["1 = 0"]))
+            params.extend(context_params)
+            rank_sql = "CASE %s END" % " ".join(
+                ["WHEN %s THEN %d" % (context_sql, i) for i in range(len(context))] or ["WHEN 1 = 1 THEN 0"])
+            rank_params = context_params
+        elif isinstance(context, QuerySet):
+            # include curation for any context matched by the queryset,
+            # which is kept as a subquery rather than evaluated
+            context_sql, context_params = context.order_by().values_list('pk').query.get_compiler(
+                using=self.db).as_sql()
+            where.append("%s = %%s" % column('context_type'))
+            where.append("%s IN (%s)" % (column('context_id'), context_sql))
+            params.extend([get_content_type(context.model).pk] + list(context_params))
+        elif context is not None:
             # only include curation for supplied context
-            context_filter = {
-                "%s__context_type" % curation_rel: ContentType.objects.get_for_model(context),
-                "%s__context_id" % curation_rel: context.id
-            }
-            curated = curated.filter(**context_filter)
-            uncurated_qs = self.filter(
-                ~Q(**context_filter) |
-                ~Q(start_filter) |
-                ~Q(end_filter)
-            )
+            where.append("%s = %%s" % column('context_type'))
+            where.append("%s = %%s" % column('context_id'))
+            params.extend([get_content_type(context).pk, context.pk])
         else:
             # exclude curation that are applied to a particular context
-            no_context_filter = {
-                "%s__context_type__isnull" % curation_rel: False
-            }
-            curated = curated.exclude(**no_context_filter)
-            uncurated_qs = self.filter(
-                ~Q(**{"%s__isnull" % curation_rel: False}) |
-                ~Q(start_filter) |
-                ~Q(end_filter) |
-                Q(**no_context_filter)
-            )
+            where.append("%s IS NULL" % column('context_type'))
 
-        # order by curation weight first but respect other ordering
-        # ordering priority taken from django.db.models.sql.compiler.get_ordering
-        if curated.query.extra_order_by:
-            ordering = curated.query.extra_order_by
-        elif not curated.query.default_ordering:
-            ordering = curated.query.order_by
+        placeholders = {
+            'id': "%s.%s" % (alias, qn(source._meta.pk.column)),
+            'content_id': column(curation_rel.object_id_field_name),
+            'weight': column('weight'),
+            'rank': rank_sql,
+        }
+        sql = "SELECT %s FROM %s %s WHERE %s" % (
+            select % placeholders,
+            qn(source._meta.db_table),
+            alias,
+            " AND ".join(where),
+        )
+        params = rank_params * select.count('%(rank)s') + params
+        if order_by is not None:
+            sql += " ORDER BY %s LIMIT 1" % (order_by % placeholders)
+            params += rank_params * order_by.count('%(rank)s')
+        return sql, params
+
+    def _get_curation_keys(self, context, now):
+        """
+        Returns (attribute, sql, params, descending) for each subquery by
+        which promoted instances are ordered
+        """
+        keys = []
+        if isinstance(context, list):
+            rank_sql, rank_params = self._active_curation_sql("MIN(%(rank)s)", context, now)
+            weight_sql, weight_params = self._active_curation_sql(
+                "%(weight)s", context, now, order_by="%(rank)s, %(weight)s DESC")
+            keys.append(('curation_rank', "(%s)" % rank_sql, rank_params, False))
         else:
-            ordering = (curated.query.order_by
-                        or curated.query.model._meta.ordering
-                        or [])
+            weight_sql, weight_params = self._active_curation_sql("MAX(%(weight)s)", context, now)
+        keys.append(('curation_weight', "(%s)" % weight_sql, weight_params, True))
+        return keys
+
+    def _curated_single_query(self, context, now):
+        """
+        Expresses curation as a single query, annotating each instance with
+        ``curation_promoted`` and ``curation_weight`` and ordering by them
+        ahead of any other ordering
+
+        When curating for a list of contexts, curations of earlier contexts
+        take priority and instances are also annotated with ``curation_rank``,
+        the position of the context they were curated for
+        """
+        promoted_sql, promoted_params = self._active_curation_sql("1", context, now)
 
-        ordering.insert(0, "-%s__weight" % curation_rel)
+        select = SortedDict()
+        select['curation_promoted'] = "EXISTS (%s)" % promoted_sql
+        select_params = list(promoted_params)
+        curation_ordering = ['-curation_promoted']
+        for attr, sql, params, descending in self._get_curation_keys(context, now):
+            select[attr] = sql
+            select_params.extend(params)
+            curation_ordering.append("%s%s" % (descending and '-' or '', attr))
+
+        ordering = self._get_ordering(self.query)
+        curated = self.extra(select=select, select_params=select_params)
+        curated._curation_ordering = curation_ordering
+        curated._curation_base = self
+        curated._curation_context = context
+        curated._curation_now = now
+        curated._curation_segment = 'single'
         curated.query.clear_ordering()
-        curated.query.order_by = ordering
+        curated.query.add_ordering(*(curated._curation_ordering + ordering))
+        return curated
+
+    def _get_keyset_fields(self):
+        """
+        Returns (field, descending) pairs for the ordering applied after
+        curation, ending with the primary key so that every row is unique
+        """
+        opts = self.model._meta
+        keys = []
+        for name in self._get_ordering(self.query):
+            if name in self._curation_ordering:
+                continue
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                name = opts.pk.name
+            if name == '?' or '__' in name or '.' in name:
+                raise ValueError("Cursor pagination does not support ordering by %r" % name)
+            field = opts.get_field(name)
+            if field.null:
+                raise ValueError("Cursor pagination requires non-nullable ordering fields, "
+                                 "%r is nullable" % name)
+            if not self.query.standard_ordering:
+                descending = not descending
+            keys.append((field, descending))
+            if field.primary_key:
+                break
+        else:
+            keys.append((opts.pk, False))
+        return keys
+
+    def _keyset_sql(self, keys, values):
+        """
+        Returns sql and params matching the rows ordered after ``values``
+        where ``keys`` are (expression, params, descending) triples
+        """
+        clauses = []
+        params = []
+        for i, (expr, expr_params, descending) in enumerate(keys):
+            parts = []
+            for j, (prev_expr, prev_params, _) in enumerate(keys[:i]):
+                parts.append("%s = %%s" % prev_expr)
+                params.extend(prev_params + [values[j]])
+            parts.append("%s %s %%s" % (expr, descending and '<' or '>'))
+            params.extend(expr_params + [values[i]])
+            clauses.append("(%s)" % " AND ".join(parts))
+        return "(%s)" % " OR ".join(clauses), params
+
+    def cursor_page(self, limit, cursor=None):
+        """
+        Returns a list of at most ``limit`` curated instances following
+        ``cursor``, along with the cursor of the next page or None once the
+        results are exhausted
+
+        Pages are located by their curation weight and ordering values rather
+        than by OFFSET, so deep pages cost the same as the first page
+        """
+        if self._curation_base is None or self._curation_segment == 'curated':
+            raise TypeError("Cursor pagination is only supported on curated querysets")
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        now = self._curation_now
+        context = self._curation_context
+        fields = self._get_keyset_fields()
+
+        page = self._curation_base._curated_single_query(context, now)
+        if self._with_curation:
+            page = page.with_curation()
+        page.query.clear_ordering()
+        page.query.add_ordering(*(page._curation_ordering + [
+            "%s%s" % (descending and '-' or '', field.name) for field, descending in fields]))
+        # the keyset fields already account for any reverse()
+        page.query.standard_ordering = True
+
+        curation_keys = self._get_curation_keys(context, now)
+
+        if cursor is not None:
+            segment, values = _decode_cursor(cursor)
+            if segment == 'curated':
+                curated_values = values[:len(curation_keys)]
+                values = values[len(curation_keys):]
+                if not all(isinstance(value, (int, long)) for value in curated_values):
+                    raise ValueError("Invalid cursor %r" % cursor)
+            if len(values) != len(fields):
+                raise ValueError("Invalid cursor %r" % cursor)
+
+            keys = []
+            prep_values = []
+            for (field, descending), value in zip(fields, values):
+                keys.append(("%s.%s" % (qn(field.model._meta.db_table), qn(field.column)), [], descending))
+                try:
+                    value = field.to_python(value)
+                except (ValidationError, TypeError):
+                    value = None
+                # keyset fields are never null
+                if value is None:
+                    raise ValueError("Invalid cursor %r" % cursor)
+                prep_values.append(field.get_db_prep_value(value, connection))
 
+            promoted_sql, promoted_params = self._active_curation_sql("1", context, now)
+            if segment == 'curated':
+                keyset_sql, keyset_params = self._keyset_sql(
+                    [(sql, params, descending) for attr, sql, params, descending in curation_keys] + keys,
+                    curated_values + prep_values)
+                where = "((EXISTS (%s) AND %s) OR NOT EXISTS (%s))" % (promoted_sql, keyset_sql, promoted_sql)
+                params = promoted_params + keyset_params + promoted_params
+            else:
+                keyset_sql, keyset_params = self._keyset_sql(keys, prep_values)
+                where = "(NOT EXISTS (%s) AND %s)" % (promoted_sql, keyset_sql)
+                params = promoted_params + keyset_params
+            page = page.extra(where=[where], params=params)
+
+        results = list(page[:limit + 1])
+        if len(results) <= limit:
+            return results, None
+
+        results = results[:limit]
+        last = results[-1]
+        values = [field.value_to_string(last) for field, descending in fields]
+        if last.curation_promoted:
+            curated_values = [getattr(last, attr) for attr, sql, params, descending in curation_keys]
+            return results, _encode_cursor('curated', curated_values + values)
+        return results, _encode_cursor('uncurated', values)
+
+    def _curated_from_cache(self, context, now):
+        """
+        Builds the curated and uncurated querysets from the cached weights of
+        active curations, avoiding any join against the curation table
+        """
+        weights = active_curations.get(self.model, context, now)
+        pks = list(weights)
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        weight_sql = "CASE %s.%s %s END" % (
+            qn(self.model._meta.db_table),
+            qn(self.model._meta.pk.column),
+            " ".join(["WHEN %s THEN %s"] * len(pks)),
+        )
+        weight_params = []
+        for pk in pks:
+            weight_params.extend([pk, weights[pk]])
+
+        ordering = self._get_ordering(self.query)
+        curated = self.filter(pk__in=pks)
+        if pks:
+            curated = curated.extra(select={'curation_weight': weight_sql}, select_params=weight_params)
+            curated.query.clear_ordering()
+            curated._curation_ordering = ['-curation_weight']
+            curated.query.add_ordering(*(curated._curation_ordering + ordering))
+        curated._curation_segment = 'curated'
+
+        uncurated_qs = self.exclude(pk__in=pks)
+        uncurated_qs._curation_segment = 'uncurated'
+        uncurated_qs._curated_qs = curated
+        uncurated_qs._curation_base = self
+        uncurated_qs._curation_context = context
+        uncurated_qs._curation_now = now
+        uncurated_qs._is_curated = True
+        return uncurated_qs
+
+    def curated(self, context=None, single_query=False, cached=False):
+        """
+        Returns a queryset of instances
+
+        When ``single_query`` is True, curation is resolved within a single
+        query, returning an ordinary queryset that can be sliced, counted and
+        cached without the overhead of combining two querysets
+
+        When ``cached`` is True, active curations are read from a process
+        local cache rather than joined against on every query
+
+        ``context`` may also be a list of contexts, in which case curation is
+        resolved within a single query with earlier contexts taking priority,
+        and instances are annotated with the ``curation_context`` they were
+        curated for
+
+        ``context`` may also be a queryset of contexts, which is resolved
+        within the same single query as a subquery; curations for any of its
+        contexts are ranked by weight alone
+        """
+        assert self.query.can_filter(), \
+            "Cannot reorder a query once a slice has been taken."
+
+        now = get_now()
+
+        if isinstance(context, tuple):
+            context = list(context)
+        if isinstance(context, (list, QuerySet)):
+            if cached:
+                raise ValueError("cached=True is not supported with several contexts")
+            single_query = True
+
+        qs = self._with_standard_ordering()
+        if single_query:
+            engine, build = 'single_query', qs._curated_single_query
+        elif cached:
+            engine, build = 'cached', qs._curated_from_cache
+        else:
+            engine, build = 'two_queries', qs._curated_two_queries
+
+        instrumentation.incr('curated.%s' % engine)
+        with instrumentation.timer('curated.time'):
+            return build(context, now)
+
+    def _promoted_where(self, context, now, negate=False):
+        """
+        Returns sql and params for a condition matching the instances
+        promoted by an active curation, or those that aren't when ``negate``
+        is True, by their pk rather than by checking every row against the
+        curations so that the lookup is driven by the curations index
+        """
+        qn = connections[self.db].ops.quote_name
+        sql, params = self._active_curation_sql("%(content_id)s", context, now, correlated=False)
+        return "%s.%s %sIN (%s)" % (
+            qn(self.model._meta.db_table),
+            qn(self.model._meta.pk.column),
+            negate and 'NOT ' or '',
+            sql,
+        ), params
+
+    def _promoted_only(self, context, now):
+        """
+        Returns a queryset of the instances promoted by an active curation,
+        once each, ordered by their curation weight first but respecting
+        other ordering
+        """
+        # only the instances looked up from the curations index are ordered
+        # by their curation keys
+        promoted_sql, promoted_params = self._promoted_where(context, now)
+        select = SortedDict()
+        select_params = []
+        curation_ordering = []
+        for attr, sql, params, descending in self._get_curation_keys(context, now):
+            select[attr] = sql
+            select_params.extend(params)
+            curation_ordering.append("%s%s" % (descending and '-' or '', attr))
+
+        ordering = self._get_ordering(self.query)
+        promoted = self.extra(
+            select=select,
+            select_params=select_params,
+            where=[promoted_sql],
+            params=promoted_params,
+        )
+        promoted._curation_ordering = curation_ordering
+        promoted.query.clear_ordering()
+        promoted.query.add_ordering(*(promoted._curation_ordering + ordering))
+        promoted._curation_segment = 'curated'
+        return promoted
+
+    def _curated_two_queries(self, context, now):
+        """
+        Builds separate querysets of the curated and uncurated instances
+        """
+        curated = self._promoted_only(context, now)
+
+        # every other instance, by the same lookup of the promoted pks
+        promoted_sql, promoted_params = self._promoted_where(context, now, negate=True)
+        uncurated_qs = self.extra(where=[promoted_sql], params=promoted_params)
         uncurated_qs._curated_qs = curated
+        uncurated_qs._curation_segment = 'uncurated'
+        uncurated_qs._curation_base = self
+        uncurated_qs._curation_context = context
+        uncurated_qs._curation_now = now
 
         uncurated_qs._is_curated = True
 
         return uncurated_qs
 
-    def __len__(self):
-        if self._is_curated:
-            return super(CuratedQuerySet, self._curated_qs).__len__() + super(CuratedQuerySet, self).__len__()
-        return super(CuratedQuerySet, self).__len__()
+    def promoted(self, context=None, limit=None, cached=False):
+        """
+        Returns only the instances promoted by an active curation, without
+        the uncurated instances, limited to the first ``limit`` of them
+        within the query
 
-    def __iter__(self):
+        ``context`` may be a list or queryset of contexts as with
+        ``curated()``; when ``cached`` is True, active curations are read from
+        the process local cache
         """
-        Custom method to support curated querysets
+        assert self.query.can_filter(), \
+            "Cannot reorder a query once a slice has been taken."
+
+        now = get_now()
+
+        if isinstance(context, tuple):
+            context = list(context)
+        if cached and isinstance(context, (list, QuerySet)):
+            raise ValueError("cached=True is not supported with several contexts")
+
+        instrumentation.incr('promoted')
+        qs = self._with_standard_ordering()
+        if cached:
+            promoted = qs._curated_from_cache(context, now)._curated_qs
+        else:
+            promoted = qs._promoted_only(context, now)
+        promoted._curation_base = qs
+        promoted._curation_context = context
+        promoted._curation_now = now
+        if limit is not None:
+            return promoted[:limit]
+        return promoted
+
+    def iterator(self, chunk_size=None):
         """
-        if self._is_curated and self._result_cache is None:
-            return itertools.chain(
-                super(CuratedQuerySet, self._curated_qs).__iter__(),
-                super(CuratedQuerySet, self).__iter__()
+        An iterator over the curated instances followed by the uncurated
+        instances, allowing the result cache to be populated as usual
+
+        When ``chunk_size`` is given, instances are fetched ``chunk_size`` at
+        a time with the same engine curation was resolved with, so that at
+        most one chunk is held in memory however many rows the queryset
+        matches
+        """
+        if chunk_size is not None and self._curation_base is not None:
+            assert self.query.can_filter(), \
+                "Cannot stream a query once a slice has been taken."
+            if isinstance(self, ValuesQuerySet):
+                raise TypeError("Chunked iteration is not supported on values querysets")
+            # fail on unsupported ordering before the first row is requested
+            if '?' in self._get_ordering(self.query):
+                raise ValueError("Chunked iteration does not support random ordering")
+            return self._iter_chunks(chunk_size)
+
+        if self._is_curated and self._concurrent:
+            iterator = itertools.chain(*parallel.run_in_threads([
+                lambda: list(instrumentation.measure_rows('segment.curated', self._curated_qs._iter_rows())),
+                lambda: list(instrumentation.measure_rows('segment.uncurated', self._iter_rows())),
+            ], self.db))
+        elif self._is_curated:
+            iterator = itertools.chain(
+                instrumentation.measure_rows('segment.curated', self._curated_qs._iter_rows()),
+                instrumentation.measure_rows('segment.uncurated', self._iter_rows())
             )
         else:
-            return super(CuratedQuerySet, self).__iter__()
+            iterator = self._iter_rows()
+            if self._curation_segment is not None:
+                iterator = instrumentation.measure_rows('segment.%s' % self._curation_segment, iterator)
+            if (isinstance(self._curation_context, list) and self._curation_ordering
+                    and not isinstance(self, ValuesQuerySet)):
+                iterator = self._annotate_context(iterator)
+
+        if self._with_curation:
+            return self._attach_curations(iterator)
+        return iterator
+
+    def _iter_rows(self):
+        """
+        Returns an iterator over the rows of this queryset alone
+        """
+        return super(CuratedQuerySet, self).iterator()
+
+    def _iter_chunks(self, chunk_size):
+        """
+        Pages by keyset where the ordering allows it, and by offset through
+        the curated instances, of which there is at most one per active
+        curation, or when ordering by nullable or related fields
+        """
+        try:
+            fields = self._get_keyset_fields()
+        except ValueError:
+            fields = None
+
+        if fields is not None and self._curation_segment == 'single':
+            return self._iter_cursor_pages(chunk_size)
+
+        qs = self._clone()
+        qs._with_curation = False
+        if fields is not None and self._is_curated:
+            qs._is_curated = False
+            curated = self._curated_qs._clone()
+            curated._with_curation = False
+            iterator = itertools.chain(curated._iter_slices(chunk_size),
+                                       qs._iter_keyset(chunk_size, fields))
+        else:
+            iterator = qs._iter_slices(chunk_size)
+        if self._with_curation:
+            return self._attach_curations(iterator)
+        return iterator
+
+    def _iter_cursor_pages(self, chunk_size):
+        cursor = None
+        while True:
+            results, cursor = self.cursor_page(chunk_size, cursor)
+            for obj in results:
+                yield obj
+            if cursor is None:
+                break
+
+    def _iter_keyset(self, chunk_size, fields):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        keys = [("%s.%s" % (qn(field.model._meta.db_table), qn(field.column)), [], descending)
+                for field, descending in fields]
+        qs = super(CuratedQuerySet, self).order_by(
+            *["%s%s" % (descending and '-' or '', field.name) for field, descending in fields])
+        qs.query.standard_ordering = True
+
+        page = qs
+        while True:
+            results = list(page[:chunk_size])
+            for obj in results:
+                yield obj
+            if len(results) < chunk_size:
+                break
+            values = [field.get_db_prep_value(getattr(results[-1], field.attname), connection)
+                      for field, descending in fields]
+            keyset_sql, keyset_params = self._keyset_sql(keys, values)
+            page = super(CuratedQuerySet, qs).extra(where=[keyset_sql], params=keyset_params)
+
+    def _iter_slices(self, chunk_size):
+        offset = 0
+        while True:
+            results = list(self[offset:offset + chunk_size])
+            for obj in results:
+                yield obj
+            if len(results) < chunk_size:
+                break
+            offset += chunk_size
+
+    def _annotate_context(self, iterator):
+        contexts = self._curation_context
+        for obj in iterator:
+            rank = getattr(obj, 'curation_rank', None)
+            obj.curation_context = rank is not None and contexts[rank] or None
+            yield obj
+
+    def _attach_curations(self, iterator):
+        """
+        Attaches the active curation selected alongside each instance,
+        fetching the curations of each chunk of instances in one query
+        """
+        contexts = self._curation_context
+        if isinstance(contexts, QuerySet):
+            # the contexts of the curations are left to be fetched on access
+            contexts = []
+        elif not isinstance(contexts, list):
+            contexts = contexts is not None and [contexts] or []
+        contexts = dict(((get_content_type(c).pk, c.pk), c) for c in contexts)
+
+        while True:
+            chunk = list(itertools.islice(iterator, CHUNK_SIZE))
+            if not chunk:
+                break
+            curations = Curation.objects.using(self.db).in_bulk(
+                [obj.curation_id for obj in chunk if getattr(obj, 'curation_id', None) is not None])
+            for obj in chunk:
+                curation = curations.get(getattr(obj, 'curation_id', None))
+                if curation is not None:
+                    # avoid queries when the generic foreign keys are followed
+                    curation._content_object_cache = obj
+                    context = contexts.get((curation.context_type_id, curation.context_id))
+                    if context is not None:
+                        curation._context_object_cache = context
+                obj.active_curation = curation
+                yield obj
+
+    def with_curation(self):
+        """
+        Returns a curated queryset whose instances have the curation that
+        promoted them, or None, attached as ``active_curation``
+        """
+        if self._curation_base is None:
+            raise TypeError("with_curation() is only supported on curated querysets")
+        if isinstance(self, ValuesQuerySet):
+            raise TypeError("with_curation() is not supported on values querysets")
+
+        context = self._curation_context
+        order_by = isinstance(context, list) and "%(rank)s, %(weight)s DESC" or "%(weight)s DESC"
+        id_sql, id_params = self._active_curation_sql("%(id)s", context, self._curation_now, order_by=order_by)
+        select = {'curation_id': "(%s)" % id_sql}
+
+        clone = self._clone()
+        if self._is_curated:
+            # slices within the curated segment are taken from it alone
+            clone._curated_qs = self._curated_qs.extra(select=select, select_params=id_params)
+            clone._curated_qs._with_curation = True
+        else:
+            # selecting another column is allowed once promoted() has sliced
+            # the query
+            clone.query.add_extra(select, id_params, None, None, None, None)
+        clone._with_curation = True
+        return clone
+
+    def _as_sql(self, connection):
+        return self.values('pk')._as_sql(connection)
+
+    def _as_nested_sql(self, connection):
+        """
+        Returns the SQL of the query nested within another, as the compiler's
+        as_nested_sql() does, with the curation subqueries correlated with
+        the renamed alias of the model's table
+        """
+        if self._db is not None and connection != connections[self._db]:
+            raise ValueError("Can't do subqueries with queries on different DBs.")
+        query = self.query.clone()
+        if query.low_mark == 0 and query.high_mark is None:
+            query.clear_ordering(True)
+        query.bump_prefix()
+        compiler = query.get_compiler(connection=connection)
+        sql, params = compiler.as_sql()
+        qn = connection.ops.quote_name
+        alias = compiler.quote_name_unless_alias(query.get_initial_alias())
+        return sql.replace("%s." % qn(self.model._meta.db_table), "%s." % alias), params
+
+    def _propagate(self, method, args, kwargs, base=True):
+        """
+        Applies ``method`` to both segments of a curated queryset, and to the
+        queryset curation was resolved from unless ``base`` is False, so that
+        cursor pages match
+        """
+        clone = getattr(super(CuratedQuerySet, self), method)(*args, **kwargs)
+        if self._is_curated:
+            clone._curated_qs = getattr(self._curated_qs, method)(*args, **kwargs)
+        if base and self._curation_base is not None:
+            clone._curation_base = getattr(self._curation_base, method)(*args, **kwargs)
+        return clone
+
+    def _filter_or_exclude(self, negate, *args, **kwargs):
+        return self._propagate('_filter_or_exclude', (negate,) + args, kwargs)
+
+    def select_related(self, *fields, **kwargs):
+        return self._propagate('select_related', fields, kwargs)
+
+    def prefetch_related(self, *lookups):
+        return self._propagate('prefetch_related', lookups, {})
+
+    def annotate(self, *args, **kwargs):
+        return self._propagate('annotate', args, kwargs)
+
+    def extra(self, *args, **kwargs):
+        return self._propagate('extra', args, kwargs)
+
+    def defer(self, *fields):
+        return self._propagate('defer', fields, {})
+
+    def only(self, *fields):
+        return self._propagate('only', fields, {})
+
+    def using(self, alias):
+        return self._propagate('using', (alias,), {})
+
+    def values(self, *fields):
+        clone = self._clone(klass=CuratedValuesQuerySet, setup=True, _fields=fields)
+        # dictionaries and tuples have no active_curation to attach
+        clone._with_curation = False
+        if self._is_curated:
+            clone._curated_qs = self._curated_qs.values(*fields)
+        return clone
+
+    def values_list(self, *fields, **kwargs):
+        flat = kwargs.pop('flat', False)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to values_list: %s'
+                    % (kwargs.keys(),))
+        if flat and len(fields) > 1:
+            raise TypeError("'flat' is not valid when values_list is called with more than one field.")
+        clone = self._clone(klass=CuratedValuesListQuerySet, setup=True, flat=flat, _fields=fields)
+        clone._with_curation = False
+        if self._is_curated:
+            clone._curated_qs = self._curated_qs.values_list(*fields, flat=flat)
+        return clone
+
+    def concurrently(self):
+        """
+        Returns a curated queryset fetching and counting its curated and
+        uncurated instances at the same time, each on a connection of its
+        own, unless the database can't be shared between threads
+        """
+        clone = self._clone()
+        clone._concurrent = True
+        return clone
+
+    def _get_curated_count(self):
+        """
+        Returns the number of curated instances, reusing an earlier count made
+        by this queryset rather than counting again
+
+        The count isn't shared with clones, which may be evaluated after
+        curations have changed
+        """
+        if self._curated_count is None:
+            instrumentation.incr('segment.curated.counts')
+            self._curated_count = super(CuratedQuerySet, self._curated_qs).count()
+        return self._curated_count
 
     def __getitem__(self, k):
         """
         Retrieves an item or slice from the set of results.
         """
-        if not self._is_curated:
+        if not self._is_curated or self._result_cache is not None:
             return super(CuratedQuerySet, self).__getitem__(k)
         else:
-            curated_length = len(self._curated_qs)
+            curated_length = self._get_curated_count()
             # set _is_curated to false so we can work with
             # the querysets independently
             qs = self._clone()
@@ -146,20 +828,23 @@ class CuratedQuerySet(QuerySet):
                     uncurated_stop = None
 
                 # slice falls completely in curated queryset
-                if stop <= curated_length and stop is not None:
+                if stop is not None and stop <= curated_length:
                     return super(CuratedQuerySet, self._curated_qs).__getitem__(k)
 
                 # slice for uncurated qs
                 uncurated_k = slice(uncurated_start, uncurated_stop, k.step)
 
                 # slice falls completely in uncurated queryset
-                if start >= curated_length:
+                if start is not None and start >= curated_length:
                     return super(CuratedQuerySet, qs).__getitem__(uncurated_k)
 
                 # slice spans curated and non-curated querysets
-                return itertools.chain(
-                    super(CuratedQuerySet, self._curated_qs).__getitem__(k),
-                    super(CuratedQuerySet, qs).__getitem__(uncurated_k))
+                curated = super(CuratedQuerySet, self._curated_qs).__getitem__(k)
+                uncurated = super(CuratedQuerySet, qs).__getitem__(uncurated_k)
+                if self._concurrent:
+                    return itertools.chain(*parallel.run_in_threads(
+                        [lambda: list(curated), lambda: list(uncurated)], self.db))
+                return itertools.chain(curated, uncurated)
             else:
                 if k >= curated_length:
                     k = k - curated_length
@@ -171,16 +856,140 @@ class CuratedQuerySet(QuerySet):
         """
         Return combined count for curated querysets
         """
-        if self._is_curated:
-            return super(CuratedQuerySet, self._curated_qs).count() + super(CuratedQuerySet, self).count()
+        if self._is_curated and (self._result_cache is None or self._iter):
+            instrumentation.incr('segment.uncurated.counts')
+            if self._concurrent and self._curated_count is None:
+                return sum(parallel.run_in_threads([
+                    self._get_curated_count,
+                    lambda: super(CuratedQuerySet, self).count(),
+                ], self.db))
+            return self._get_curated_count() + super(CuratedQuerySet, self).count()
         else:
             return super(CuratedQuerySet, self).count()
 
-    def reverse(self):
+    def exists(self):
         """
-        Reverses the ordering of the QuerySet.
+        Returns True if either the curated or the uncurated queryset contains
+        any results, reusing the result cache when it has been populated
+        """
+        if self._is_curated and self._result_cache is None:
+            return (super(CuratedQuerySet, self._curated_qs).exists()
+                    or super(CuratedQuerySet, self).exists())
+        return super(CuratedQuerySet, self).exists()
+
+    def order_by(self, *field_names):
         """
+        Returns a new QuerySet instance with the ordering changed, keeping
+        curation ahead of the supplied ordering
+        """
+        clone = super(CuratedQuerySet, self).order_by(*(list(self._curation_ordering) + list(field_names)))
         if self._is_curated:
-            raise NotImplementedError("Reverse is not implemented on curated querysets")
-        else:
+            clone._curated_qs = self._curated_qs.order_by(*field_names)
+        if self._curation_base is not None:
+            clone._curation_base = self._curation_base.order_by(*field_names)
+        return clone
+
+    def reverse(self):
+        """
+        Reverses the ordering of the QuerySet, keeping promoted instances
+        first on curated querysets
+        """
+        if self._curation_base is None:
             return super(CuratedQuerySet, self).reverse()
+        return self.order_by(*[self._reverse_ordering(name) for name in self._get_ordering(self.query)
+                                if name not in self._curation_ordering])
+
+    def _with_standard_ordering(self):
+        """
+        Returns the queryset with an earlier reverse() folded into its
+        ordering, so that the curation ordering added to it isn't reversed
+        """
+        if self.query.standard_ordering:
+            return self
+        clone = super(CuratedQuerySet, self).order_by(
+            *[self._reverse_ordering(name) for name in self._get_ordering(self.query)])
+        clone.query.standard_ordering = True
+        return clone
+
+    def _reverse_ordering(self, name):
+        if name == '?':
+            return name
+        if name.startswith('-'):
+            return name[1:]
+        return '-' + name
+
+    def distinct(self, *field_names):
+        return self._propagate('distinct', field_names, {})
+
+
+class CuratedValuesQuerySet(CuratedQuerySet, ValuesQuerySet):
+    """
+    Values query set keeping the curation columns it is ordered by selected
+    but leaving them out of the values returned
+    """
+
+    def _setup_query(self):
+        super(CuratedValuesQuerySet, self)._setup_query()
+        if self.query.extra_select_mask is not None:
+            ordering = [name.lstrip('-') for name in self._get_ordering(self.query)
+                        if isinstance(name, basestring)]
+            hidden = [name for name in self.query.extra
+                      if name in ordering and name not in self.query.extra_select_mask]
+            if hidden:
+                self.query.set_extra_mask(list(self.query.extra_select_mask) + hidden)
+
+    def _get_hidden_names(self):
+        if not self._fields:
+            return []
+        return [name for name in self.query.extra_select if name not in self._fields]
+
+    def _as_sql(self, connection):
+        """
+        Returns the SQL of the query used as a subquery, selecting the
+        requested field alone
+        """
+        if ((self._fields and len(self._fields) > 1) or
+                (not self._fields and len(self.model._meta.fields) > 1)):
+            raise TypeError('Cannot use a multi-field %s as a filter value.'
+                    % self.__class__.__name__)
+        if self._is_curated:
+            raise TypeError("Curated querysets of two segments can't be used as subqueries, "
+                            "use curated(single_query=True) or promoted()")
+
+        obj = self._clone()
+        hidden = obj._get_hidden_names()
+        sliced = obj.query.low_mark or obj.query.high_mark is not None
+        if hidden and not sliced:
+            obj.query.set_extra_mask([name for name in obj.query.extra_select if name not in hidden])
+        sql, params = obj._as_nested_sql(connection)
+        if hidden and sliced:
+            # the slice depends on the ordering by the hidden columns, so they
+            # stay selected within a derived table and are left out around it
+            qn = connection.ops.quote_name
+            sql = "SELECT %s FROM (%s) %s" % (qn(obj.query.select[0][1]), sql, qn('curated_values'))
+        return sql, params
+
+    def _iter_rows(self):
+        hidden = self._get_hidden_names()
+        for row in super(CuratedValuesQuerySet, self)._iter_rows():
+            for name in hidden:
+                del row[name]
+            yield row
+
+
+class CuratedValuesListQuerySet(CuratedValuesQuerySet, ValuesListQuerySet):
+    def _iter_rows(self):
+        if not self._get_hidden_names():
+            return ValuesListQuerySet.iterator(self)
+        return self._iter_values()
+
+    def _iter_values(self):
+        # the extra columns always come first, whether they are hidden or not
+        names = list(self.query.extra_select) + self.field_names + list(self.query.aggregate_select)
+        fields = list(self._fields) + [f for f in self.query.aggregate_select if f not in self._fields]
+        for row in self.query.get_compiler(self.db).results_iter():
+            data = dict(zip(names, row))
+            if self.flat:
+                yield data[fields[0]]
+            else:
+                yield tuple([data[f] for f in fields])
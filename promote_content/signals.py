@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+
+# sent once after curations have been created, updated or deleted in bulk,
+# where the per instance post_save and post_delete signals are not sent.
+# ``queryset`` matches the changed curations, or is None when unknown
+curations_changed = Signal(providing_args=["queryset"])
@@ -0,0 +1,149 @@
+import math
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models.signals import post_save, post_delete
+
+from .cache import active_curations, bump_version, get_version
+from .models import Curation
+from .signals import curations_changed
+from .utils import get_now
+
+
+registry = {}
+
+caches = {}
+
+VERSION_KEY = 'promote_content:snapshot:version'
+
+
+def get_snapshot_cache():
+    alias = getattr(settings, 'PROMOTE_CONTENT_CACHE_ALIAS', None) or 'default'
+    if alias not in caches:
+        caches[alias] = get_cache(alias)
+    return caches[alias]
+
+
+class Snapshot(object):
+    """
+    The ordered primary keys of a curated queryset, built in the background
+    and stored in a cache so that pages are served by a single pk__in query
+
+    ``context`` may be a callable returning the context, so that snapshots
+    can be registered before the database is available
+
+    Snapshots are stored under a version bumped whenever curations change,
+    so that a snapshot built from curations changed meanwhile is never read
+    """
+
+    def __init__(self, name, queryset, context=None):
+        self.name = name
+        self.queryset = queryset
+        self.context = context
+
+    @property
+    def cache(self):
+        return get_snapshot_cache()
+
+    def get_key(self, version):
+        return 'promote_content:snapshot:%s:%s' % (version, self.name)
+
+    def get_context(self):
+        if callable(self.context):
+            return self.context()
+        return self.context
+
+    def get_curated(self):
+        """
+        Returns the live curated queryset the snapshot is built from
+        """
+        return self.queryset.all().curated(context=self.get_context(), single_query=True)
+
+    def build(self):
+        """
+        Stores the current ranking, until the next start or end among the
+        curations it was built from, and returns the number of instances
+        """
+        now = get_now()
+        # read before the curations, so that changes made while building
+        # bump the version past the one the snapshot is stored under
+        version = get_version(self.cache, VERSION_KEY)
+        context = self.get_context()
+        pks = list(self.queryset.all().curated(context=context).values_list('pk', flat=True))
+
+        timeout = getattr(settings, 'PROMOTE_CONTENT_SNAPSHOT_TIMEOUT', 60 * 60)
+        expires = active_curations.get_expires(self.queryset.model, context, now)
+        if expires is not None:
+            delta = expires - now
+            seconds = delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+            timeout = min(timeout, int(math.ceil(seconds)))
+        if timeout > 0:
+            self.cache.set(self.get_key(version), pks, timeout)
+        return len(pks)
+
+    def get(self):
+        """
+        Returns the stored primary keys, or None if the snapshot has not been
+        built or is out of date
+        """
+        return self.cache.get(self.get_key(get_version(self.cache, VERSION_KEY)))
+
+    def invalidate(self):
+        self.cache.delete(self.get_key(get_version(self.cache, VERSION_KEY)))
+
+    def results(self):
+        return SnapshotResults(self)
+
+
+class SnapshotResults(object):
+    """
+    Sliceable results of a snapshot, falling back to the live curated
+    queryset while the snapshot is missing
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._pks = snapshot.get()
+
+    def _fetch(self, pks):
+        objects = self.snapshot.queryset.all().in_bulk(list(pks))
+        # instances deleted since the snapshot was built are left out
+        return [objects[pk] for pk in pks if pk in objects]
+
+    def count(self):
+        if self._pks is None:
+            return self.snapshot.get_curated().count()
+        return len(self._pks)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        if self._pks is None:
+            return iter(self.snapshot.get_curated())
+        return iter(self._fetch(self._pks))
+
+    def __getitem__(self, k):
+        if self._pks is None:
+            return self.snapshot.get_curated()[k]
+        if isinstance(k, slice):
+            return self._fetch(self._pks[k])
+        return self._fetch([self._pks[k]])[0]
+
+
+def register(name, queryset, context=None):
+    """
+    Registers a snapshot of ``queryset`` curated for ``context``, built by
+    the build_curation_snapshots command
+    """
+    snapshot = registry[name] = Snapshot(name, queryset, context)
+    return snapshot
+
+
+def invalidate_snapshots(sender, **kwargs):
+    if registry:
+        bump_version(get_snapshot_cache(), VERSION_KEY)
+
+post_save.connect(invalidate_snapshots, sender=Curation)
+post_delete.connect(invalidate_snapshots, sender=Curation)
+curations_changed.connect(invalidate_snapshots, sender=Curation)
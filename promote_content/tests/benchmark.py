@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+"""
+Benchmarks curated querysets against a generated dataset on SQLite.
+
+Reports the number of queries, the wall time and the growth of the peak
+resident memory of each scenario and curation engine, e.g.::
+
+    python benchmark.py --contents=100000 --contexts=50 --curations=2000
+
+Each run of a scenario is forked from the same process so that its peak
+memory is measured from the same starting point. The growth includes the
+pages copied on write, around a megabyte and a half, which is the floor of
+the memory column.
+"""
+
+import json
+import os
+import random
+import resource
+import sys
+import time
+import traceback
+from optparse import OptionParser
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'test_settings'
+
+from django.conf import settings
+from django.db import connection, reset_queries
+from django.utils import timezone
+
+
+ENGINES = (
+    ('two queries', {}),
+    ('single query', {'single_query': True}),
+    ('cached', {'cached': True}),
+)
+
+# the composite indexes added by migrations 0002 and 0003, which syncdb
+# doesn't create
+INDEXES = (
+    ('promote_content_curation', ('content_type_id', 'content_id', 'context_type_id', 'context_id')),
+    ('promote_content_curation', ('context_type_id', 'context_id', 'content_type_id')),
+    ('promote_content_activepromotion', ('content_type_id', 'content_id', 'context_type_id', 'context_id')),
+)
+
+
+class Measurement(object):
+    """
+    The queries, wall time and peak memory growth of a run of a scenario
+    """
+
+    def __init__(self, queries, time, memory):
+        self.queries = queries
+        self.time = time
+        self.memory = memory
+
+
+def measure(func):
+    """
+    Calls ``func`` in a forked child process and returns its Measurement;
+    the peak resident set size of the child starts from its size at fork
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            reset_queries()
+            start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.time()
+            func()
+            elapsed = time.time() - start
+            memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss
+            os.write(write_fd, json.dumps([len(connection.queries), elapsed, memory]))
+            status = 0
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    if not chunks:
+        raise RuntimeError("The scenario failed")
+    return Measurement(*json.loads("".join(chunks)))
+
+
+def setup_database(options):
+    settings.DEBUG = True
+    settings.INSTALLED_APPS = list(settings.INSTALLED_APPS) + ['promote_content.tests']
+    connection.settings_dict['TEST_NAME'] = ':memory:'
+    connection.creation.create_test_db(verbosity=0)
+
+    cursor = connection.cursor()
+    qn = connection.ops.quote_name
+    for i, (table, columns) in enumerate(INDEXES):
+        cursor.execute("CREATE INDEX %s ON %s (%s)" % (
+            qn('benchmark_%s' % i), qn(table), ", ".join(map(qn, columns))))
+
+    from promote_content.models import Curation
+    from promote_content.tests.models import TestContent, TestContextTarget
+    from promote_content.utils import get_content_type
+
+    TestContent.objects.bulk_create(
+        [TestContent(name="Content %s" % i) for i in range(options.contents)], batch_size=500)
+    TestContextTarget.objects.bulk_create(
+        [TestContextTarget(name="Context %s" % i) for i in range(options.contexts)], batch_size=500)
+
+    rng = random.Random(0)
+    now = timezone.now()
+    content_ids = list(TestContent.objects.values_list('pk', flat=True))
+    contexts = list(TestContextTarget.objects.all())
+    content_type = get_content_type(TestContent)
+    context_type = get_content_type(TestContextTarget)
+    curations = []
+    for i in range(options.curations):
+        context = i % 2 and rng.choice(contexts) or None
+        end = None
+        if i % 3 == 0:
+            # a third of the curations have ended
+            end = now - timezone.timedelta(days=rng.randint(1, 365))
+        curations.append(Curation(
+            content_type=content_type,
+            content_id=rng.choice(content_ids),
+            context_type=context is not None and context_type or None,
+            context_id=context is not None and context.pk or None,
+            weight=rng.randint(0, 10),
+            end=end,
+        ))
+    Curation.objects.bulk_create(curations, batch_size=500)
+    return contexts[0]
+
+
+def scenarios(context, options):
+    from promote_content.tests.models import TestContent
+
+    offsets = sorted(set([0, 100, 1000, options.contents // 2]))
+    for name, kwargs in ENGINES:
+        curated = lambda **extra: TestContent.objects.order_by('name').curated(**dict(kwargs, **extra))
+        # warm caches shared by every engine before measuring
+        list(curated()[:1])
+        list(curated(context=context)[:1])
+
+        yield name, 'iterate', lambda: len(list(curated()))
+        yield name, 'len', lambda: len(curated())
+        yield name, 'count', lambda: curated().count()
+        for offset in offsets:
+            yield name, 'slice [%s:%s]' % (offset, offset + 20), \
+                lambda offset=offset: list(curated()[offset:offset + 20])
+        yield name, 'index [0]', lambda: curated()[0]
+        yield name, 'context slice [0:20]', lambda: list(curated(context=context)[:20])
+        yield name, 'context count', lambda: curated(context=context).count()
+        yield name, 'cursor first page', lambda: curated().cursor_page(20)
+        # the cursor is obtained outside of the measurement
+        middle = options.contents // 2
+        cursor = curated().cursor_page(middle)[1]
+        yield name, 'cursor page after %s' % middle, \
+            lambda cursor=cursor: curated().cursor_page(20, cursor=cursor)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('--contents', type='int', default=10000,
+                      help='Number of curated model instances.')
+    parser.add_option('--contexts', type='int', default=20,
+                      help='Number of context instances.')
+    parser.add_option('--curations', type='int', default=500,
+                      help='Number of curations, half of them in a context.')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='Number of times each scenario is run, the best run is reported.')
+    options, args = parser.parse_args()
+
+    old_name = settings.DATABASES['default']['NAME']
+    context = setup_database(options)
+    try:
+        row = "%-14s %-28s %8s %10s %12s"
+        print(row % ('engine', 'scenario', 'queries', 'time (ms)', 'memory (kB)'))
+        for engine, scenario, func in scenarios(context, options):
+            results = [measure(func) for i in range(options.repeat)]
+            best = min(results, key=lambda m: m.time)
+            print(row % (engine, scenario, best.queries, "%.1f" % (best.time * 1000),
+                         max(m.memory for m in results)))
+            sys.stdout.flush()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,7 @@ class Content(models.Model):
 
 class TestContent(Content):
     name = models.CharField(max_length=20)
+    published = models.DateTimeField(null=True, blank=True)
 
     def __unicode__(self):
         return self.name
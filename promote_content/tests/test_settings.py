@@ -11,6 +11,8 @@ DEBUG=True
 DATABASES={
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
+        # a file rather than memory, so that threads can share the test data
+        'TEST_NAME': os.path.join(test_dir, 'test.sqlite'),
     }
 }
 
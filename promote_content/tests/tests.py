@@ -1,17 +1,36 @@
+import base64
 import datetime
+import json
+import os
+import tempfile
+import threading
 from operator import attrgetter
+from StringIO import StringIO
 
 from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.util import lookup_field
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.contenttypes.models import ContentType
 from django.core.management import call_command
+from django.db import connection
 from django.db.models import loading
-from django.test import TestCase
+from django.db.models.signals import post_delete
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
 from django.utils import timezone
 
 from .models import TestContent, TestContextTarget
-from ..models import Curation
+from .. import bulk, instrumentation, parallel, snapshots
+from ..admin import CurateAdmin
+from ..cache import ActiveCurationCache, active_curations
+from ..models import ActivePromotion, Curation
+from ..signals import curations_changed
+from ..utils import _content_types, get_content_type, get_generic_relation, get_now, warm_content_types
 
 
-class PromoteContentTestsBase(TestCase):
+class PromoteContentTestsMixin(object):
     apps = ('promote_content.tests',)
 
     def _pre_setup(self):
@@ -26,15 +45,27 @@ class PromoteContentTestsBase(TestCase):
         loading.cache.loaded = False
         call_command('syncdb', interactive=False, verbosity=0)
         # Call the original method that does the fixtures etc.
-        super(PromoteContentTestsBase, self)._pre_setup()
+        super(PromoteContentTestsMixin, self)._pre_setup()
 
     def _post_teardown(self):
-        super(PromoteContentTestsBase, self)._post_teardown()
+        super(PromoteContentTestsMixin, self)._post_teardown()
         # Restore installed apps to original value
         settings.INSTALLED_APPS = self._original_installed_apps
         loading.cache.loaded = False
 
 
+class PromoteContentTestsBase(PromoteContentTestsMixin, TestCase):
+    pass
+
+
+class PromoteContentTransactionTestsBase(PromoteContentTestsMixin, TransactionTestCase):
+    def setUp(self):
+        # the tables are flushed between transaction test cases
+        ContentType.objects.clear_cache()
+        _content_types.clear()
+        active_curations.clear()
+
+
 class OrderingTests(PromoteContentTestsBase):
     def setUp(self):
         self.c1 = TestContent.objects.create(
@@ -158,6 +189,40 @@ class OrderingTests(PromoteContentTestsBase):
             attrgetter("name")
         )
 
+    def test_overlapping_curations(self):
+        """
+        Instances with several active curations are promoted once, by the
+        greatest weight
+        """
+        Curation.objects.create(content_object=self.c3, weight=1)
+        Curation.objects.create(content_object=self.c3, weight=3)
+        Curation.objects.create(content_object=self.c1, weight=2)
+
+        qs = TestContent.objects.curated()
+        self.assertEqual(qs.count(), 3)
+        self.assertEqual(len(TestContent.objects.curated()), 3)
+        self.assertEqual([obj.curation_weight for obj in qs[:2]], [3, 2])
+        self.assertEqual([obj.name for obj in qs[1:3]], [self.c1.name, self.c2.name])
+
+    def test_active_and_ended_curations(self):
+        """
+        Instances with an active curation aren't also listed as uncurated
+        because of curations that have ended
+        """
+        Curation.objects.create(content_object=self.c3, end=timezone.now() - datetime.timedelta(days=1))
+        Curation.objects.create(content_object=self.c3)
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(),
+            [
+                self.c3.name,
+                self.c1.name,
+                self.c2.name,
+            ],
+            attrgetter("name")
+        )
+        self.assertEqual(TestContent.objects.curated().count(), 3)
+
     def test_curated_slice(self):
         c = Curation(content_object=self.c2)
         c.save()
@@ -743,3 +808,1501 @@ class ContextualCurationStartEndTests(PromoteContentTestsBase):
     def test_mixed_curations_future_end(self):
         self.mixed_setup()
         self.test_contextual_future_end()
+
+
+class SingleQueryCurationTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.c1 = TestContent.objects.create(
+            name="Test 1"
+        )
+
+        self.c2 = TestContent.objects.create(
+            name="Test 2"
+        )
+
+        self.c3 = TestContent.objects.create(
+            name="Test 3"
+        )
+
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_single_query_weights(self):
+        Curation.objects.create(content_object=self.c2, weight=1)
+        Curation.objects.create(content_object=self.c3, weight=2)
+
+        with self.assertNumQueries(1):
+            self.assertQuerysetEqual(
+                TestContent.objects.curated(single_query=True),
+                [
+                    self.c3.name,
+                    self.c2.name,
+                    self.c1.name,
+                ],
+                attrgetter("name")
+            )
+
+    def test_single_query_extra_ordering(self):
+        Curation.objects.create(content_object=self.c2)
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(single_query=True).order_by('-id'),
+            [
+                self.c2.name,
+                self.c3.name,
+                self.c1.name,
+            ],
+            attrgetter("name")
+        )
+
+        self.assertQuerysetEqual(
+            TestContent.objects.order_by('-id').curated(single_query=True),
+            [
+                self.c2.name,
+                self.c3.name,
+                self.c1.name,
+            ],
+            attrgetter("name")
+        )
+
+    def test_single_query_context(self):
+        Curation.objects.create(content_object=self.c3, weight=2)
+        Curation.objects.create(content_object=self.c2, context_object=self.context1)
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(context=self.context1, single_query=True),
+            [
+                self.c2.name,
+                self.c1.name,
+                self.c3.name,
+            ],
+            attrgetter("name")
+        )
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(single_query=True),
+            [
+                self.c3.name,
+                self.c1.name,
+                self.c2.name,
+            ],
+            attrgetter("name")
+        )
+
+    def test_single_query_start_end(self):
+        now = timezone.now()
+        Curation.objects.create(content_object=self.c2, end=now - datetime.timedelta(days=1))
+        Curation.objects.create(content_object=self.c3, start=now + datetime.timedelta(days=1))
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(single_query=True),
+            [
+                self.c1.name,
+                self.c2.name,
+                self.c3.name,
+            ],
+            attrgetter("name")
+        )
+
+    def test_single_query_slice_and_count(self):
+        Curation.objects.create(content_object=self.c3)
+        # overlapping curations should not duplicate rows
+        Curation.objects.create(content_object=self.c3, weight=1)
+
+        qs = TestContent.objects.curated(single_query=True)
+        self.assertEqual(qs.count(), 3)
+        self.assertEqual(qs[0].name, self.c3.name)
+        self.assertEqual(qs[0].curation_weight, 1)
+        self.assertQuerysetEqual(
+            qs[1:],
+            [
+                self.c1.name,
+                self.c2.name,
+            ],
+            attrgetter("name")
+        )
+
+
+class CursorPaginationTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.contents = [
+            TestContent.objects.create(name="Test %s" % i) for i in range(1, 8)
+        ]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def _paginate(self, qs, limit):
+        pages = []
+        results, cursor = qs.cursor_page(limit)
+        pages.append(results)
+        while cursor is not None:
+            results, cursor = qs.cursor_page(limit, cursor=cursor)
+            pages.append(results)
+        return pages
+
+    def test_cursor_pages_match_curated_ordering(self):
+        Curation.objects.create(content_object=self.contents[4], weight=1)
+        Curation.objects.create(content_object=self.contents[2], weight=3)
+        Curation.objects.create(content_object=self.contents[6], weight=2)
+
+        for qs in (TestContent.objects.curated(),
+                   TestContent.objects.curated(single_query=True),
+                   TestContent.objects.curated().order_by('-name')):
+            pages = self._paginate(qs, 2)
+            self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+            self.assertEqual(
+                [obj.name for page in pages for obj in page],
+                [obj.name for obj in qs]
+            )
+
+    def test_cursor_page_queries(self):
+        Curation.objects.create(content_object=self.contents[2], context_object=self.context1)
+        qs = TestContent.objects.curated(context=self.context1)
+
+        with self.assertNumQueries(1):
+            results, cursor = qs.cursor_page(3)
+        self.assertEqual(
+            [obj.name for obj in results],
+            ["Test 3", "Test 1", "Test 2"]
+        )
+
+        with self.assertNumQueries(1):
+            results, cursor = qs.cursor_page(3, cursor=cursor)
+        self.assertEqual(
+            [obj.name for obj in results],
+            ["Test 4", "Test 5", "Test 6"]
+        )
+
+        results, cursor = qs.cursor_page(3, cursor=cursor)
+        self.assertEqual([obj.name for obj in results], ["Test 7"])
+        self.assertEqual(cursor, None)
+
+    def test_cursor_page_uncurated_queryset(self):
+        self.assertRaises(TypeError, TestContent.objects.all().cursor_page, 2)
+
+    def test_invalid_cursor(self):
+        qs = TestContent.objects.curated()
+        self.assertRaises(ValueError, qs.cursor_page, 2, "invalid")
+        for data in ({'curated': 1}, 1, [], ["uncurated", "x"], ["uncurated", [1]], ["curated", "x", 1],
+                     ["uncurated", None]):
+            cursor = base64.urlsafe_b64encode(json.dumps(data))
+            self.assertRaises(ValueError, qs.cursor_page, 2, cursor)
+
+    def test_iterator_chunks(self):
+        Curation.objects.create(content_object=self.contents[4], weight=1)
+        Curation.objects.create(content_object=self.contents[2], weight=3)
+        Curation.objects.create(content_object=self.contents[6], context_object=self.context1)
+
+        for qs in (TestContent.objects.curated(),
+                   TestContent.objects.curated(cached=True),
+                   TestContent.objects.curated(context=[self.context1]),
+                   TestContent.objects.curated().order_by('-name')):
+            # seven rows fetched three at a time
+            with self.assertNumQueries(3):
+                streamed = list(qs.iterator(chunk_size=3))
+            self.assertEqual([obj.name for obj in streamed], [obj.name for obj in qs])
+
+        streamed = list(TestContent.objects.curated(context=[self.context1]).with_curation().iterator(chunk_size=3))
+        self.assertEqual(streamed[0].curation_context, self.context1)
+        self.assertEqual(streamed[0].active_curation.content_object, self.contents[6])
+
+    def test_iterator_chunks_keep_engine(self):
+        Curation.objects.create(content_object=self.contents[4], weight=1)
+        qs = TestContent.objects.curated(cached=True)
+
+        connection.use_debug_cursor = True
+        try:
+            # one curated row, then six uncurated rows three at a time
+            with self.assertNumQueries(4):
+                streamed = list(qs.iterator(chunk_size=3))
+            sql = " ".join(query['sql'] for query in connection.queries[-4:])
+        finally:
+            connection.use_debug_cursor = False
+        self.assertFalse(Curation._meta.db_table in sql)
+        self.assertEqual([obj.name for obj in streamed], [obj.name for obj in qs])
+
+    def test_iterator_chunks_nullable_ordering(self):
+        Curation.objects.create(content_object=self.contents[4], weight=1)
+        TestContent.objects.filter(pk__in=[c.pk for c in self.contents[:3]]).update(published=timezone.now())
+
+        for qs in (TestContent.objects.curated().order_by('published', 'name'),
+                   TestContent.objects.curated(single_query=True).order_by('-published', 'name')):
+            self.assertEqual(
+                [obj.name for obj in qs.iterator(chunk_size=2)],
+                [obj.name for obj in qs]
+            )
+
+    def test_reverse_before_curated(self):
+        Curation.objects.create(content_object=self.contents[4], weight=1)
+        base = TestContent.objects.order_by('name').reverse()
+        for qs in (base.curated(), base.curated(single_query=True), base.curated(cached=True)):
+            expected = ["Test 5", "Test 7", "Test 6", "Test 4", "Test 3", "Test 2", "Test 1"]
+            self.assertEqual([obj.name for obj in qs.iterator(chunk_size=2)], expected)
+            self.assertEqual([obj.name for page in self._paginate(qs, 2) for obj in page], expected)
+
+    def test_iterator_chunks_unsupported_ordering(self):
+        self.assertRaises(ValueError, TestContent.objects.curated().order_by('?').iterator, chunk_size=2)
+
+
+class CuratedSliceQueryTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.c1 = TestContent.objects.create(
+            name="Test 1"
+        )
+
+        self.c2 = TestContent.objects.create(
+            name="Test 2"
+        )
+
+        self.c3 = TestContent.objects.create(
+            name="Test 3"
+        )
+
+        Curation.objects.create(content_object=self.c2, weight=2)
+        Curation.objects.create(content_object=self.c3, weight=1)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_index_counts_curated(self):
+        qs = TestContent.objects.curated()
+        # one count for the boundary and one query for the item
+        with self.assertNumQueries(2):
+            self.assertEqual(qs[0].name, self.c2.name)
+        # the boundary is remembered between lookups
+        with self.assertNumQueries(1):
+            self.assertEqual(qs[2].name, self.c1.name)
+        with self.assertNumQueries(1):
+            self.assertEqual(qs.count(), 3)
+
+    def test_clones_count_again(self):
+        qs = TestContent.objects.curated()
+        self.assertEqual(qs.count(), 3)
+        self.assertEqual(qs[1].name, self.c3.name)
+
+        c4 = TestContent.objects.create(name="Test 4")
+        Curation.objects.create(content_object=c4, weight=3)
+        self.assertEqual(qs.all().count(), 4)
+        self.assertEqual(qs.all()[2].name, self.c3.name)
+        self.assertEqual([obj.name for obj in qs.all()[:3]], ["Test 4", "Test 2", "Test 3"])
+
+    def test_segments_lookup_promoted_pks(self):
+        # both segments look up the promoted pks rather than checking every
+        # row against the curations
+        qs = TestContent.objects.curated()
+        self.assertFalse("EXISTS" in str(qs._curated_qs.query))
+        self.assertFalse("EXISTS" in str(qs.query))
+        self.assertEqual([obj.name for obj in qs[:2]], [self.c2.name, self.c3.name])
+
+    def test_slice_uses_curated_cache(self):
+        qs = TestContent.objects.curated()
+        list(qs._curated_qs)
+
+        with self.assertNumQueries(0):
+            self.assertQuerysetEqual(
+                qs[:2],
+                [
+                    self.c2.name,
+                    self.c3.name,
+                ],
+                attrgetter("name")
+            )
+
+
+class CuratedResultCacheTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.c1 = TestContent.objects.create(
+            name="Test 1"
+        )
+
+        self.c2 = TestContent.objects.create(
+            name="Test 2"
+        )
+
+        Curation.objects.create(content_object=self.c2)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_iterate_twice(self):
+        qs = TestContent.objects.curated()
+        with self.assertNumQueries(2):
+            first = [obj.name for obj in qs]
+        with self.assertNumQueries(0):
+            second = [obj.name for obj in qs]
+        self.assertEqual(first, [self.c2.name, self.c1.name])
+        self.assertEqual(first, second)
+
+    def test_len_then_iterate(self):
+        qs = TestContent.objects.curated()
+        with self.assertNumQueries(2):
+            self.assertEqual(len(qs), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual([obj.name for obj in qs], [self.c2.name, self.c1.name])
+            self.assertTrue(qs)
+            self.assertTrue(qs.exists())
+            self.assertEqual(qs.count(), 2)
+            self.assertEqual(qs[1].name, self.c1.name)
+
+    def test_bool_then_iterate(self):
+        qs = TestContent.objects.curated()
+        self.assertTrue(qs)
+        with self.assertNumQueries(0):
+            self.assertEqual([obj.name for obj in qs], [self.c2.name, self.c1.name])
+
+    def test_exists(self):
+        self.assertTrue(TestContent.objects.filter(id=self.c2.id).curated().exists())
+        self.assertTrue(TestContent.objects.filter(id=self.c1.id).curated().exists())
+        self.assertFalse(TestContent.objects.filter(id=0).curated().exists())
+
+
+class CuratedProjectionTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.c1 = TestContent.objects.create(name="Test 1")
+        self.c2 = TestContent.objects.create(name="Test 2")
+        self.c3 = TestContent.objects.create(name="Test 3")
+        self.c4 = TestContent.objects.create(name="Test 4")
+        Curation.objects.create(content_object=self.c3, weight=2)
+        Curation.objects.create(content_object=self.c2, weight=1)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def _curated(self):
+        return (TestContent.objects.curated(),
+                TestContent.objects.curated(single_query=True),
+                TestContent.objects.curated(cached=True))
+
+    def test_filter_after_curated(self):
+        for qs in self._curated():
+            qs = qs.exclude(pk=self.c2.pk).filter(pk__lt=self.c4.pk)
+            self.assertEqual([obj.name for obj in qs], ["Test 3", "Test 1"])
+            self.assertEqual(qs.count(), 2)
+            self.assertEqual([obj.name for obj in qs.cursor_page(1)[0]], ["Test 3"])
+
+    def test_values_list(self):
+        for qs in self._curated():
+            self.assertEqual(
+                list(qs.values_list('name', flat=True)),
+                ["Test 3", "Test 2", "Test 1", "Test 4"]
+            )
+            self.assertEqual(
+                list(qs.values_list('pk', 'name')[1:3]),
+                [(self.c2.pk, "Test 2"), (self.c1.pk, "Test 1")]
+            )
+
+    def test_values(self):
+        for qs in self._curated():
+            self.assertEqual(
+                list(qs.values('name')),
+                [{'name': "Test 3"}, {'name': "Test 2"}, {'name': "Test 1"}, {'name': "Test 4"}]
+            )
+
+    def test_values_as_subquery(self):
+        promoted = TestContent.objects.filter(pk__in=TestContent.objects.promoted().values('pk'))
+        self.assertEqual(sorted(promoted.values_list('name', flat=True)), ["Test 2", "Test 3"])
+
+        top = TestContent.objects.promoted(limit=1).values('pk')
+        self.assertEqual(list(TestContent.objects.filter(pk__in=top)), [self.c3])
+        self.assertEqual(list(TestContent.objects.filter(pk__in=TestContent.objects.promoted(limit=1))),
+                         [self.c3])
+
+        Curation.objects.create(content_object=self.c1, end=timezone.now() - datetime.timedelta(days=1))
+        curations = Curation.objects.filter(content_id__in=TestContent.objects.promoted().values('pk'))
+        self.assertEqual(sorted(c.content_id for c in curations), [self.c2.pk, self.c3.pk])
+        curations = Curation.objects.filter(
+            content_id__in=TestContent.objects.curated(single_query=True).values('pk')[:1])
+        self.assertEqual([c.content_id for c in curations], [self.c3.pk])
+
+        self.assertRaises(TypeError, len, TestContent.objects.filter(pk__in=TestContent.objects.curated()))
+
+        top = TestContent.objects.curated(single_query=True).values_list('pk', flat=True)[:3]
+        self.assertEqual(
+            sorted(TestContent.objects.filter(pk__in=top).values_list('name', flat=True)),
+            ["Test 1", "Test 2", "Test 3"]
+        )
+
+    def test_values_after_with_curation(self):
+        for qs in self._curated():
+            self.assertEqual(
+                list(qs.with_curation().values_list('name', flat=True)),
+                ["Test 3", "Test 2", "Test 1", "Test 4"]
+            )
+            self.assertEqual(list(qs.with_curation().values('name'))[0], {'name': "Test 3"})
+
+    def test_only(self):
+        for qs in self._curated():
+            results = list(qs.only('id'))
+            self.assertEqual([obj.pk for obj in results], [self.c3.pk, self.c2.pk, self.c1.pk, self.c4.pk])
+            self.assertTrue(all(obj._deferred for obj in results))
+
+
+class CuratedOrderingTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.c1 = TestContent.objects.create(name="Test 1")
+        self.c2 = TestContent.objects.create(name="Test 2")
+        self.c3 = TestContent.objects.create(name="Test 3")
+        self.c4 = TestContent.objects.create(name="Test 4")
+        self.c5 = TestContent.objects.create(name="Test 5")
+        Curation.objects.create(content_object=self.c2, weight=1)
+        Curation.objects.create(content_object=self.c4, weight=1)
+        Curation.objects.create(content_object=self.c3, weight=2)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def _curated(self):
+        return (TestContent.objects.curated(),
+                TestContent.objects.curated(single_query=True),
+                TestContent.objects.curated(cached=True))
+
+    def test_order_by_after_curated(self):
+        for qs in self._curated():
+            self.assertEqual(
+                [obj.name for obj in qs.order_by('-name')],
+                ["Test 3", "Test 4", "Test 2", "Test 5", "Test 1"]
+            )
+
+    def test_reverse(self):
+        for qs in self._curated():
+            qs = qs.order_by('name').reverse()
+            self.assertEqual(
+                [obj.name for obj in qs],
+                ["Test 3", "Test 4", "Test 2", "Test 5", "Test 1"]
+            )
+            self.assertEqual([obj.name for obj in qs[3:]], ["Test 5", "Test 1"])
+            self.assertEqual(
+                [obj.name for obj in qs.reverse()],
+                ["Test 3", "Test 2", "Test 4", "Test 1", "Test 5"]
+            )
+            self.assertEqual([obj.name for obj in qs.cursor_page(2)[0]], ["Test 3", "Test 4"])
+
+    def test_reverse_before_curated(self):
+        base = TestContent.objects.order_by('name').reverse()
+        for qs in (base.curated(), base.curated(single_query=True), base.curated(cached=True)):
+            self.assertEqual(
+                [obj.name for obj in qs],
+                ["Test 3", "Test 4", "Test 2", "Test 5", "Test 1"]
+            )
+        for cached in (False, True):
+            self.assertEqual(
+                [obj.name for obj in base.promoted(cached=cached)],
+                ["Test 3", "Test 4", "Test 2"]
+            )
+
+    def test_distinct(self):
+        for qs in self._curated():
+            qs = qs.order_by('name').distinct()
+            self.assertEqual(
+                [obj.name for obj in qs],
+                ["Test 3", "Test 2", "Test 4", "Test 1", "Test 5"]
+            )
+            self.assertEqual(qs.count(), 5)
+
+
+class ConcurrentSegmentsTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.c1 = TestContent.objects.create(name="Test 1")
+        self.c2 = TestContent.objects.create(name="Test 2")
+        self.c3 = TestContent.objects.create(name="Test 3")
+        Curation.objects.create(content_object=self.c2, weight=1)
+        self._can_run_in_threads = parallel.can_run_in_threads
+
+    def tearDown(self):
+        parallel.can_run_in_threads = self._can_run_in_threads
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_concurrently(self):
+        # uncommitted changes fall back to running the segments in turn
+        self.assertFalse(parallel.can_run_in_threads('default'))
+        qs = TestContent.objects.curated().concurrently()
+        self.assertEqual([obj.name for obj in qs], ["Test 2", "Test 1", "Test 3"])
+        self.assertEqual(qs.filter(name__lt="Test 3").count(), 2)
+        self.assertEqual([obj.name for obj in qs[:2]], ["Test 2", "Test 1"])
+        self.assertEqual(qs.get(pk=self.c2.pk), self.c2)
+
+    def test_run_in_threads(self):
+        parallel.can_run_in_threads = lambda using: True
+        threads = parallel.run_in_threads([
+            lambda: threading.current_thread(),
+            lambda: threading.current_thread(),
+        ], 'default')
+        self.assertNotEqual(threads[0], threads[1])
+        self.assertEqual(threads[1], threading.current_thread())
+
+    def test_run_in_threads_error(self):
+        parallel.can_run_in_threads = lambda using: True
+
+        def fail():
+            raise KeyError("segment")
+
+        self.assertRaises(KeyError, parallel.run_in_threads, [fail, lambda: 1], 'default')
+
+
+class ThreadedSegmentsTests(PromoteContentTransactionTestsBase):
+    def setUp(self):
+        super(ThreadedSegmentsTests, self).setUp()
+        self.c1 = TestContent.objects.create(name="Test 1")
+        self.c2 = TestContent.objects.create(name="Test 2")
+        self.c3 = TestContent.objects.create(name="Test 3")
+        Curation.objects.create(content_object=self.c3, weight=1)
+        self._run_in_threads = parallel.run_in_threads
+        self.threads = []
+
+    def tearDown(self):
+        parallel.run_in_threads = self._run_in_threads
+
+    def _record_threads(self, funcs, using):
+        self.threads.append(parallel.can_run_in_threads(using))
+        return self._run_in_threads(funcs, using)
+
+    def test_concurrently(self):
+        parallel.run_in_threads = self._record_threads
+        qs = TestContent.objects.curated().concurrently()
+        self.assertEqual(qs.filter(name__lt="Test 3").count(), 2)
+        self.assertEqual([obj.name for obj in qs], ["Test 3", "Test 1", "Test 2"])
+        self.assertEqual([obj.name for obj in qs.all()[:2]], ["Test 3", "Test 1"])
+        self.assertEqual(self.threads, [True, True, True])
+
+
+class SnapshotTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.contents = [TestContent.objects.create(name="Test %s" % i) for i in range(1, 6)]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+        Curation.objects.create(content_object=self.contents[3], context_object=self.context1)
+        Curation.objects.create(content_object=self.contents[1], weight=1)
+
+        self.snapshot = snapshots.register(
+            'test', TestContent.objects.exclude(name="Test 1"), context=lambda: self.context1)
+        self.snapshot.invalidate()
+
+    def tearDown(self):
+        snapshots.registry.clear()
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_results(self):
+        self.assertEqual(self.snapshot.build(), 4)
+
+        results = self.snapshot.results()
+        self.assertEqual(len(results), 4)
+        with self.assertNumQueries(1):
+            self.assertEqual([obj.name for obj in results[:2]], ["Test 4", "Test 2"])
+        with self.assertNumQueries(1):
+            self.assertEqual(results[3].name, "Test 5")
+
+    def test_cache(self):
+        self.assertTrue(snapshots.get_snapshot_cache() is self.snapshot.cache)
+
+    def test_missing_snapshot(self):
+        results = self.snapshot.results()
+        self.assertEqual(results.count(), 4)
+        self.assertEqual([obj.name for obj in results[:2]], ["Test 4", "Test 2"])
+        with self.assertNumQueries(1):
+            self.assertEqual([obj.name for obj in results], ["Test 4", "Test 2", "Test 3", "Test 5"])
+
+    def test_iterate(self):
+        self.snapshot.build()
+        results = self.snapshot.results()
+        with self.assertNumQueries(1):
+            self.assertEqual([obj.name for obj in results], ["Test 4", "Test 2", "Test 3", "Test 5"])
+
+    def test_changed_while_building(self):
+        def context():
+            # curations change after the snapshot has started building
+            Curation.objects.create(content_object=self.contents[4], context_object=self.context1, weight=1)
+            return self.context1
+
+        self.snapshot.context = context
+        self.snapshot.build()
+        self.assertEqual(self.snapshot.get(), None)
+
+    def test_invalidated_by_curation_changes(self):
+        self.snapshot.build()
+        Curation.objects.create(content_object=self.contents[4], context_object=self.context1, weight=1)
+        self.assertEqual(self.snapshot.get(), None)
+        self.assertEqual([obj.name for obj in self.snapshot.results()[:2]], ["Test 5", "Test 4"])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('build_curation_snapshots', stdout=out)
+        self.assertEqual(out.getvalue(), "test: 4 instances\n")
+        self.assertEqual(
+            list(self.snapshot.get()),
+            [self.contents[3].pk, self.contents[1].pk, self.contents[2].pk, self.contents[4].pk]
+        )
+
+
+@override_settings(PROMOTE_CONTENT_NOW_GRANULARITY=60)
+class NowGranularityTests(PromoteContentTestsBase):
+    def setUp(self):
+        self._now = timezone.now
+        self.c1 = TestContent.objects.create(name="Test 1")
+        self.c2 = TestContent.objects.create(name="Test 2")
+
+    def tearDown(self):
+        timezone.now = self._now
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_get_now(self):
+        now = get_now()
+        self.assertEqual((now.second, now.microsecond), (0, 0))
+        self.assertTrue(timezone.now() - now < datetime.timedelta(minutes=1))
+
+        with self.settings(PROMOTE_CONTENT_NOW_GRANULARITY=None):
+            self.assertNotEqual(get_now().microsecond, 0)
+
+    def _at(self, *times):
+        times = list(times)
+        timezone.now = lambda: times.pop(0)
+
+    def test_rounds_timestamp(self):
+        with self.settings(PROMOTE_CONTENT_NOW_GRANULARITY=7 * 60 * 60):
+            self._at(datetime.datetime(2013, 5, 3, 3, 30), datetime.datetime(2013, 5, 2, 22))
+            # both within the interval starting at 9pm on the 2nd
+            self.assertEqual(get_now(), datetime.datetime(2013, 5, 2, 21))
+            self.assertEqual(get_now(), datetime.datetime(2013, 5, 2, 21))
+
+    def test_identical_queries(self):
+        for kwargs in ({}, {'single_query': True}):
+            self._at(datetime.datetime(2013, 5, 1, 12, 0, 5, 10), datetime.datetime(2013, 5, 1, 12, 0, 55))
+            first = TestContent.objects.curated(**kwargs)
+            second = TestContent.objects.curated(**kwargs)
+            self.assertEqual(str(first.query), str(second.query))
+
+    def test_curations_start_at_the_next_interval(self):
+        Curation.objects.create(content_object=self.c2, start=get_now() + datetime.timedelta(microseconds=1))
+        self.assertEqual([obj.name for obj in TestContent.objects.curated()], ["Test 1", "Test 2"])
+
+
+class PromotedTests(PromoteContentTestsBase):
+    def setUp(self):
+        active_curations.clear()
+        self.contents = [TestContent.objects.create(name="Test %s" % i) for i in range(1, 6)]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+        self.context2 = TestContextTarget.objects.create(name="Context2")
+        Curation.objects.create(content_object=self.contents[3], weight=1)
+        Curation.objects.create(content_object=self.contents[1], weight=2)
+        Curation.objects.create(content_object=self.contents[1], weight=1)
+        Curation.objects.create(content_object=self.contents[4], weight=1)
+        Curation.objects.create(content_object=self.contents[0], end=timezone.now() - datetime.timedelta(days=1))
+        Curation.objects.create(content_object=self.contents[2], context_object=self.context1)
+        Curation.objects.create(content_object=self.contents[0], context_object=self.context2)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_promoted(self):
+        for cached in (False, True):
+            self.assertEqual(
+                [obj.name for obj in TestContent.objects.promoted(cached=cached)],
+                ["Test 2", "Test 4", "Test 5"]
+            )
+            self.assertEqual(
+                [obj.name for obj in TestContent.objects.order_by('-name').promoted(cached=cached)],
+                ["Test 2", "Test 5", "Test 4"]
+            )
+            self.assertEqual(
+                [obj.name for obj in TestContent.objects.promoted(context=self.context1, cached=cached)],
+                ["Test 3"]
+            )
+
+    def test_limit(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [obj.name for obj in TestContent.objects.promoted(limit=2)],
+                ["Test 2", "Test 4"]
+            )
+        # promoted instances are looked up by pk rather than row by row
+        self.assertFalse("EXISTS" in str(TestContent.objects.promoted(limit=2).query))
+
+    def test_multiple_contexts(self):
+        promoted = list(TestContent.objects.promoted(context=[self.context2, self.context1]))
+        self.assertEqual([obj.name for obj in promoted], ["Test 1", "Test 3"])
+        self.assertEqual([obj.curation_context for obj in promoted], [self.context2, self.context1])
+        contexts = TestContextTarget.objects.filter(pk__in=[self.context1.pk, self.context2.pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                sorted(obj.name for obj in TestContent.objects.promoted(context=contexts)),
+                ["Test 1", "Test 3"]
+            )
+        self.assertRaises(ValueError, TestContent.objects.promoted, context=[self.context1], cached=True)
+
+    def test_with_curation(self):
+        for cached in (False, True):
+            promoted = list(TestContent.objects.promoted(limit=2, cached=cached).with_curation())
+            self.assertEqual(
+                [(obj.name, obj.active_curation.weight) for obj in promoted],
+                [("Test 2", 2), ("Test 4", 1)]
+            )
+        promoted = list(TestContent.objects.promoted(context=self.context1).with_curation())
+        self.assertEqual(promoted[0].active_curation.context_object, self.context1)
+
+
+class ActiveCurationCacheTests(PromoteContentTestsBase):
+    def setUp(self):
+        active_curations.clear()
+
+        self.c1 = TestContent.objects.create(
+            name="Test 1"
+        )
+
+        self.c2 = TestContent.objects.create(
+            name="Test 2"
+        )
+
+        self.c3 = TestContent.objects.create(
+            name="Test 3"
+        )
+
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_cached_ordering(self):
+        Curation.objects.create(content_object=self.c2, weight=1)
+        Curation.objects.create(content_object=self.c3, weight=2)
+        Curation.objects.create(content_object=self.c1, context_object=self.context1)
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(cached=True),
+            [
+                self.c3.name,
+                self.c2.name,
+                self.c1.name,
+            ],
+            attrgetter("name")
+        )
+
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(context=self.context1, cached=True).order_by('-id'),
+            [
+                self.c1.name,
+                self.c3.name,
+                self.c2.name,
+            ],
+            attrgetter("name")
+        )
+
+    def test_cache_hit(self):
+        Curation.objects.create(content_object=self.c2)
+        list(TestContent.objects.curated(cached=True))
+
+        # only the curated and uncurated querysets are evaluated
+        with self.assertNumQueries(2):
+            self.assertQuerysetEqual(
+                TestContent.objects.curated(cached=True),
+                [
+                    self.c2.name,
+                    self.c1.name,
+                    self.c3.name,
+                ],
+                attrgetter("name")
+            )
+
+    def test_cache_cleared_on_change(self):
+        c = Curation.objects.create(content_object=self.c2)
+        self.assertEqual(active_curations.get(TestContent), {self.c2.id: 0})
+
+        c.weight = 2
+        c.save()
+        self.assertEqual(active_curations.get(TestContent), {self.c2.id: 2})
+
+        c.delete()
+        self.assertEqual(active_curations.get(TestContent), {})
+
+    def test_cache_expires_at_boundary(self):
+        now = timezone.now()
+        Curation.objects.create(content_object=self.c2, end=now + datetime.timedelta(hours=1))
+        Curation.objects.create(content_object=self.c3, start=now + datetime.timedelta(hours=2))
+
+        self.assertEqual(active_curations.get(TestContent, now=now), {self.c2.id: 0})
+        with self.assertNumQueries(0):
+            active_curations.get(TestContent, now=now + datetime.timedelta(minutes=30))
+        self.assertEqual(
+            active_curations.get(TestContent, now=now + datetime.timedelta(hours=3)),
+            {self.c3.id: 0}
+        )
+
+    def test_get_expires(self):
+        now = timezone.now()
+        end = now + datetime.timedelta(hours=1)
+        Curation.objects.create(content_object=self.c2, end=end)
+        Curation.objects.create(content_object=self.c3, start=now + datetime.timedelta(hours=2))
+
+        self.assertEqual(active_curations.get_expires(TestContent, now=now), end)
+        self.assertEqual(active_curations.get_expires(TestContent, self.context1, now=now), None)
+
+
+@override_settings(PROMOTE_CONTENT_CACHE_ALIAS='default')
+class SharedCurationCacheTests(PromoteContentTestsBase):
+    def setUp(self):
+        active_curations.clear()
+
+        self.c1 = TestContent.objects.create(
+            name="Test 1"
+        )
+
+        self.c2 = TestContent.objects.create(
+            name="Test 2"
+        )
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_shared_between_processes(self):
+        Curation.objects.create(content_object=self.c2, weight=1)
+        self.assertEqual(active_curations.get(TestContent), {self.c2.id: 1})
+
+        # a cache in another process reads the shared entry
+        other = ActiveCurationCache()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get(TestContent), {self.c2.id: 1})
+
+    def test_version_bumped_on_change(self):
+        other = ActiveCurationCache()
+        c = Curation.objects.create(content_object=self.c2, weight=1)
+        self.assertEqual(other.get(TestContent), {self.c2.id: 1})
+
+        # changes made by another process invalidate local entries
+        version = other.shared.get_version()
+        c.weight = 2
+        c.save()
+        self.assertNotEqual(other.shared.get_version(), version)
+        self.assertEqual(other.get(TestContent), {self.c2.id: 2})
+
+    def test_shared_entry_expires(self):
+        now = timezone.now()
+        Curation.objects.create(content_object=self.c2, end=now + datetime.timedelta(hours=1))
+        self.assertEqual(active_curations.get(TestContent, now=now), {self.c2.id: 0})
+
+        other = ActiveCurationCache()
+        self.assertEqual(
+            other.get(TestContent, now=now + datetime.timedelta(hours=2)),
+            {}
+        )
+
+    def test_curated_from_shared_cache(self):
+        Curation.objects.create(content_object=self.c2)
+        list(TestContent.objects.curated(cached=True))
+        active_curations._entries = {}
+
+        with self.assertNumQueries(2):
+            self.assertQuerysetEqual(
+                TestContent.objects.curated(cached=True),
+                [
+                    self.c2.name,
+                    self.c1.name,
+                ],
+                attrgetter("name")
+            )
+
+
+class MetadataResolutionTests(PromoteContentTestsBase):
+    def test_generic_relation_prepared(self):
+        gen_rel = get_generic_relation(TestContent)
+        self.assertEqual(gen_rel.name, 'curation')
+        self.assertEqual(get_generic_relation(TestContextTarget), None)
+
+    def test_warm_content_types(self):
+        _content_types.clear()
+        ContentType.objects.clear_cache()
+        with self.assertNumQueries(1):
+            warm_content_types(TestContent, TestContextTarget)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_content_type(TestContent).model, 'testcontent')
+            self.assertEqual(get_content_type(TestContextTarget(name="Context")).model, 'testcontexttarget')
+            TestContent.objects.curated(context=TestContextTarget(id=1))
+
+
+class BulkCurationTests(PromoteContentTestsBase):
+    def setUp(self):
+        active_curations.clear()
+
+        self.contents = [
+            TestContent.objects.create(name="Test %s" % i) for i in range(1, 5)
+        ]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+        self.context2 = TestContextTarget.objects.create(name="Context2")
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_promote(self):
+        with self.assertNumQueries(1):
+            bulk.promote(self.contents[2:], contexts=[self.context1, self.context2], weight=1)
+        self.assertEqual(Curation.objects.count(), 4)
+
+        bulk.promote(self.contents[1:2], weight=2)
+        for single_query in (False, True):
+            self.assertQuerysetEqual(
+                TestContent.objects.curated(context=self.context2, single_query=single_query),
+                [
+                    "Test 3",
+                    "Test 4",
+                    "Test 1",
+                    "Test 2",
+                ],
+                attrgetter("name")
+            )
+            self.assertQuerysetEqual(
+                TestContent.objects.curated(single_query=single_query),
+                [
+                    "Test 2",
+                    "Test 1",
+                    "Test 3",
+                    "Test 4",
+                ],
+                attrgetter("name")
+            )
+
+    def test_curations_for(self):
+        bulk.promote(self.contents, contexts=[self.context1])
+        bulk.promote(self.contents)
+
+        self.assertEqual(bulk.curations_for(self.contents[:2]).count(), 2)
+        self.assertEqual(bulk.curations_for(self.contents[:3], contexts=[self.context1]).count(), 3)
+        self.assertEqual(bulk.curations_for(self.contents, contexts=[self.context2]).count(), 0)
+
+    def test_reweight_reschedule_expire(self):
+        bulk.promote(self.contents)
+        curations = bulk.curations_for(self.contents[2:])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(bulk.reweight(curations, 5), 2)
+        self.assertEqual(
+            [c.weight for c in Curation.objects.order_by('content_id')],
+            [0, 0, 5, 5]
+        )
+
+        tomorrow = timezone.now() + datetime.timedelta(days=1)
+        self.assertEqual(bulk.reschedule(bulk.curations_for(self.contents[:1]), start=tomorrow), 1)
+        self.assertEqual(Curation.objects.filter(start=tomorrow).count(), 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(bulk.expire(bulk.curations_for(self.contents[3:])), 1)
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(),
+            [
+                "Test 3",
+                "Test 2",
+                "Test 1",
+                "Test 4",
+            ],
+            attrgetter("name")
+        )
+
+    def test_reschedule_only_passed_bounds(self):
+        bulk.promote(self.contents[:1])
+        curations = bulk.curations_for(self.contents[:1])
+        monday = timezone.now() + datetime.timedelta(days=1)
+        friday = monday + datetime.timedelta(days=4)
+
+        bulk.reschedule(curations, end=friday)
+        bulk.reschedule(curations, start=monday)
+        self.assertEqual(list(curations.values_list('start', 'end')), [(monday, friday)])
+
+        bulk.reschedule(curations, end=None)
+        self.assertEqual(list(curations.values_list('start', 'end')), [(monday, None)])
+        self.assertRaises(TypeError, bulk.reschedule, curations)
+
+    def test_cache_cleared_once(self):
+        self.assertEqual(active_curations.get(TestContent), {})
+        generation = active_curations._generation
+        bulk.promote(self.contents, weight=1)
+        self.assertEqual(active_curations._generation, generation + 1)
+        self.assertEqual(len(active_curations.get(TestContent)), 4)
+
+
+class MultipleContextCurationTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.contents = [
+            TestContent.objects.create(name="Test %s" % i) for i in range(1, 6)
+        ]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+        self.context2 = TestContextTarget.objects.create(name="Context2")
+        self.context3 = TestContextTarget.objects.create(name="Context3")
+
+        Curation.objects.create(content_object=self.contents[0], context_object=self.context2, weight=5)
+        Curation.objects.create(content_object=self.contents[1], context_object=self.context1, weight=1)
+        Curation.objects.create(content_object=self.contents[2], context_object=self.context1, weight=2)
+        # curated in both contexts, the first context takes priority
+        Curation.objects.create(content_object=self.contents[3], context_object=self.context1, weight=0)
+        Curation.objects.create(content_object=self.contents[3], context_object=self.context2, weight=9)
+        # not within the requested contexts
+        Curation.objects.create(content_object=self.contents[4], context_object=self.context3, weight=9)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_context_priority(self):
+        with self.assertNumQueries(1):
+            results = list(TestContent.objects.curated(context=[self.context1, self.context2]))
+
+        self.assertEqual(
+            [(obj.name, obj.curation_context, obj.curation_weight) for obj in results],
+            [
+                ("Test 3", self.context1, 2),
+                ("Test 2", self.context1, 1),
+                ("Test 4", self.context1, 0),
+                ("Test 1", self.context2, 5),
+                ("Test 5", None, None),
+            ]
+        )
+
+    def test_context_queryset(self):
+        contexts = TestContextTarget.objects.filter(name__in=["Context1", "Context2"]).order_by('-name')
+        with self.assertNumQueries(1):
+            results = list(TestContent.objects.curated(context=contexts))
+        self.assertEqual(
+            [obj.name for obj in results],
+            [
+                "Test 4",
+                "Test 1",
+                "Test 3",
+                "Test 2",
+                "Test 5",
+            ]
+        )
+
+    def test_context_queryset_with_curation(self):
+        contexts = TestContextTarget.objects.filter(name__in=["Context1", "Context2"])
+        results = list(TestContent.objects.curated(context=contexts).with_curation())
+        self.assertEqual(
+            [(obj.name, obj.active_curation and obj.active_curation.weight) for obj in results],
+            [
+                ("Test 4", 9),
+                ("Test 1", 5),
+                ("Test 3", 2),
+                ("Test 2", 1),
+                ("Test 5", None),
+            ]
+        )
+
+    def test_cached_contexts(self):
+        self.assertRaises(ValueError, TestContent.objects.curated, context=[self.context1], cached=True)
+
+    def test_no_contexts(self):
+        self.assertQuerysetEqual(
+            TestContent.objects.curated(context=[]),
+            [
+                "Test 1",
+                "Test 2",
+                "Test 3",
+                "Test 4",
+                "Test 5",
+            ],
+            attrgetter("name")
+        )
+
+    def test_cursor_page(self):
+        qs = TestContent.objects.curated(context=[self.context1, self.context2])
+        results, cursor = qs.cursor_page(2)
+        names = [obj.name for obj in results]
+        while cursor is not None:
+            results, cursor = qs.cursor_page(2, cursor=cursor)
+            names.extend([obj.name for obj in results])
+        self.assertEqual(names, ["Test 3", "Test 2", "Test 4", "Test 1", "Test 5"])
+
+
+class CurationMetadataTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.contents = [
+            TestContent.objects.create(name="Test %s" % i) for i in range(1, 5)
+        ]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+        self.end = timezone.now() + datetime.timedelta(days=1)
+
+        self.curation1 = Curation.objects.create(content_object=self.contents[1], weight=1, end=self.end)
+        self.curation2 = Curation.objects.create(content_object=self.contents[2], weight=2)
+        self.curation3 = Curation.objects.create(content_object=self.contents[3], context_object=self.context1)
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def _assert_curations(self, qs, expected):
+        results = list(qs)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [(obj.name, obj.active_curation) for obj in results],
+                expected
+            )
+            for obj in results:
+                if obj.active_curation is not None:
+                    self.assertEqual(obj.active_curation.content_object, obj)
+
+    def test_with_curation(self):
+        expected = [
+            ("Test 3", self.curation2),
+            ("Test 2", self.curation1),
+            ("Test 1", None),
+            ("Test 4", None),
+        ]
+        for qs in (TestContent.objects.curated(),
+                   TestContent.objects.curated(single_query=True),
+                   TestContent.objects.curated(cached=True)):
+            self._assert_curations(qs.with_curation(), expected)
+
+        results = list(TestContent.objects.curated().with_curation())
+        self.assertEqual(results[1].active_curation.end, self.end)
+        self.assertEqual(results[1].active_curation.weight, 1)
+
+    def test_with_curation_slices(self):
+        for qs in (TestContent.objects.curated(),
+                   TestContent.objects.curated(single_query=True),
+                   TestContent.objects.curated(cached=True)):
+            qs = qs.with_curation()
+            self._assert_curations(qs[:2], [("Test 3", self.curation2), ("Test 2", self.curation1)])
+            self._assert_curations(qs[1:3], [("Test 2", self.curation1), ("Test 1", None)])
+            self._assert_curations(qs[3:], [("Test 4", None)])
+            self.assertEqual(qs[0].active_curation, self.curation2)
+            self.assertEqual(qs[2].active_curation, None)
+
+    def test_with_curation_greatest_weight(self):
+        Curation.objects.create(content_object=self.contents[2], weight=0)
+        results = list(TestContent.objects.curated(single_query=True).with_curation())
+        self.assertEqual(results[0].active_curation, self.curation2)
+
+    def test_with_curation_queries(self):
+        with self.assertNumQueries(2):
+            list(TestContent.objects.curated(single_query=True).with_curation())
+
+    def test_with_curation_context(self):
+        qs = TestContent.objects.curated(context=[self.context1]).with_curation()
+        self._assert_curations(qs, [
+            ("Test 4", self.curation3),
+            ("Test 1", None),
+            ("Test 2", None),
+            ("Test 3", None),
+        ])
+        with self.assertNumQueries(0):
+            self.assertEqual(list(qs)[0].active_curation.context_object, self.context1)
+
+    def test_with_curation_uncurated_queryset(self):
+        self.assertRaises(TypeError, TestContent.objects.all().with_curation)
+
+
+@override_settings(PROMOTE_CONTENT_ACTIVE_PROMOTIONS=True)
+class ActivePromotionTests(PromoteContentTestsBase):
+    def setUp(self):
+        active_curations.clear()
+
+        self.c1 = TestContent.objects.create(
+            name="Test 1"
+        )
+
+        self.c2 = TestContent.objects.create(
+            name="Test 2"
+        )
+
+        self.c3 = TestContent.objects.create(
+            name="Test 3"
+        )
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_maintained_on_save(self):
+        now = timezone.now()
+        c = Curation.objects.create(content_object=self.c2, weight=1)
+        self.assertEqual(ActivePromotion.objects.get().weight, 1)
+
+        c.weight = 3
+        c.save()
+        self.assertEqual(ActivePromotion.objects.get().weight, 3)
+
+        c.end = now - datetime.timedelta(days=1)
+        c.save()
+        self.assertEqual(ActivePromotion.objects.count(), 0)
+
+        c.end = None
+        c.save()
+        c.delete()
+        self.assertEqual(ActivePromotion.objects.count(), 0)
+
+    def test_curated_reads_active_promotions(self):
+        Curation.objects.create(content_object=self.c3, weight=1)
+        Curation.objects.create(content_object=self.c2, weight=2)
+        # promotions only appear once they are copied to the table
+        ActivePromotion.objects.filter(curation__content_id=self.c2.id).delete()
+
+        qs = TestContent.objects.curated(single_query=True)
+        self.assertTrue(ActivePromotion._meta.db_table in str(qs.query))
+        self.assertQuerysetEqual(
+            qs,
+            [
+                self.c3.name,
+                self.c1.name,
+                self.c2.name,
+            ],
+            attrgetter("name")
+        )
+        self.assertEqual(active_curations.get(TestContent), {self.c3.id: 1})
+
+    def test_rebuild_and_sweep(self):
+        now = timezone.now()
+        bulk.promote([self.c1, self.c2], end=now + datetime.timedelta(hours=1))
+        bulk.promote([self.c3], end=now - datetime.timedelta(hours=1))
+        self.assertEqual(ActivePromotion.objects.count(), 2)
+
+        ActivePromotion.objects.sweep(now=now + datetime.timedelta(hours=2))
+        self.assertEqual(ActivePromotion.objects.count(), 0)
+
+        call_command('refresh_active_promotions', rebuild=True, verbosity=0)
+        self.assertEqual(
+            sorted(ActivePromotion.objects.values_list('content_id', flat=True)),
+            [self.c1.id, self.c2.id]
+        )
+
+
+    def test_bulk_changes_sync_affected_promotions(self):
+        bulk.promote([self.c1, self.c2])
+        # a full rebuild would copy this promotion back
+        ActivePromotion.objects.filter(curation__content_id=self.c1.id).delete()
+
+        bulk.reweight(bulk.curations_for([self.c2]), 4)
+        self.assertEqual(list(ActivePromotion.objects.values_list('content_id', 'weight')), [(self.c2.id, 4)])
+
+        bulk.expire(bulk.curations_for([self.c2]))
+        self.assertEqual(ActivePromotion.objects.count(), 0)
+
+        bulk.promote([self.c3])
+        self.assertEqual(list(ActivePromotion.objects.values_list('content_id', flat=True)), [self.c3.id])
+
+
+class SweepCurationsTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.contents = [
+            TestContent.objects.create(name="Test %s" % i) for i in range(1, 6)
+        ]
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+
+        now = timezone.now()
+        self.ended = now - datetime.timedelta(days=2)
+        bulk.promote(self.contents, end=self.ended)
+        bulk.promote(self.contents[:2], contexts=[self.context1], end=self.ended)
+        bulk.promote(self.contents[:1], end=now + datetime.timedelta(days=1))
+        bulk.promote(self.contents[1:2])
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('sweep_curations', dry_run=True, stdout=out)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            [
+                "tests.testcontent (no context): 5",
+                "tests.testcontent (tests.testcontexttarget %s): 2" % self.context1.id,
+                "7 curations would be deleted",
+            ]
+        )
+        self.assertEqual(Curation.objects.count(), 9)
+
+    def test_sweep_in_batches(self):
+        batches = []
+        deleted = []
+        receiver = lambda sender, queryset=None, **kwargs: batches.append(queryset)
+        delete_receiver = lambda sender, instance, **kwargs: deleted.append(instance)
+        curations_changed.connect(receiver, sender=Curation)
+        post_delete.connect(delete_receiver, sender=Curation)
+        generation = active_curations._generation
+        try:
+            # three queries for each of three batches, and one finding no more
+            with self.assertNumQueries(10):
+                call_command('sweep_curations', batch_size=3, verbosity=0)
+        finally:
+            curations_changed.disconnect(receiver, sender=Curation)
+            post_delete.disconnect(delete_receiver, sender=Curation)
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(deleted, [])
+        self.assertEqual(active_curations._generation, generation + 3)
+        self.assertEqual(Curation.objects.count(), 2)
+        self.assertEqual(Curation.objects.filter(end__lt=timezone.now()).count(), 0)
+
+    def test_active_promotions_removed(self):
+        # copy the curations as they were before they ended
+        ActivePromotion.objects.rebuild(now=self.ended - datetime.timedelta(days=1))
+        self.assertEqual(ActivePromotion.objects.count(), 9)
+        call_command('sweep_curations', batch_size=3, verbosity=0)
+        self.assertEqual(ActivePromotion.objects.count(), 2)
+
+    def test_days(self):
+        call_command('sweep_curations', days=3, verbosity=0)
+        self.assertEqual(Curation.objects.count(), 9)
+
+    def test_archive(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            call_command('sweep_curations', batch_size=5, archive=path, verbosity=0)
+            with open(path) as archive:
+                batches = [json.loads(line) for line in archive]
+        finally:
+            os.remove(path)
+        self.assertEqual([len(batch) for batch in batches], [5, 2])
+        self.assertEqual(batches[0][0]['model'], 'promote_content.curation')
+
+
+class RecordingMetrics(object):
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+
+    def incr(self, name, count=1):
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def timing(self, name, value):
+        self.timings.setdefault(name, []).append(value)
+
+
+@override_settings(PROMOTE_CONTENT_METRICS='promote_content.tests.tests.RecordingMetrics')
+class InstrumentationTests(PromoteContentTestsBase):
+    def setUp(self):
+        instrumentation._backends.clear()
+        active_curations.clear()
+        self.metrics = instrumentation.get_metrics()
+
+        self.c1 = TestContent.objects.create(name="Test 1")
+        self.c2 = TestContent.objects.create(name="Test 2")
+        self.c3 = TestContent.objects.create(name="Test 3")
+        Curation.objects.create(content_object=self.c2, weight=1)
+
+    def tearDown(self):
+        instrumentation._backends.clear()
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+
+    def test_null_metrics(self):
+        with self.settings(PROMOTE_CONTENT_METRICS=None):
+            self.assertFalse(instrumentation.get_metrics().enabled)
+            self.assertEqual(len(list(TestContent.objects.curated())), 3)
+        self.assertEqual(self.metrics.counters, {})
+
+    def test_segments(self):
+        self.assertEqual(len(list(TestContent.objects.curated())), 3)
+        self.assertEqual(self.metrics.counters, {
+            'promote_content.curated.two_queries': 1,
+            'promote_content.segment.curated.queries': 1,
+            'promote_content.segment.curated.rows': 1,
+            'promote_content.segment.uncurated.queries': 1,
+            'promote_content.segment.uncurated.rows': 2,
+        })
+        self.assertEqual(sorted(self.metrics.timings), [
+            'promote_content.curated.time',
+            'promote_content.segment.curated.time',
+            'promote_content.segment.uncurated.time',
+        ])
+
+    def test_single_query(self):
+        list(TestContent.objects.curated(single_query=True)[:2])
+        self.assertEqual(self.metrics.counters['promote_content.curated.single_query'], 1)
+        self.assertEqual(self.metrics.counters['promote_content.segment.single.rows'], 2)
+
+    def test_cache(self):
+        list(TestContent.objects.curated(cached=True))
+        list(TestContent.objects.curated(cached=True))
+        self.assertEqual(self.metrics.counters['promote_content.cache.misses'], 1)
+        self.assertEqual(self.metrics.counters['promote_content.cache.hits'], 1)
+        self.assertEqual(self.metrics.counters['promote_content.curated.cached'], 2)
+
+    def test_prefix(self):
+        with self.settings(PROMOTE_CONTENT_METRICS_PREFIX='site.promotions'):
+            TestContent.objects.curated().count()
+        self.assertEqual(self.metrics.counters, {
+            'site.promotions.curated.two_queries': 1,
+            'site.promotions.segment.curated.counts': 1,
+            'site.promotions.segment.uncurated.counts': 1,
+        })
+
+
+class CurateAdminTests(PromoteContentTestsBase):
+    def setUp(self):
+        self.model_admin = CurateAdmin(Curation, admin.site)
+        self.context1 = TestContextTarget.objects.create(name="Context1")
+        now = timezone.now()
+        self.active = Curation.objects.create(
+            content_object=TestContent.objects.create(name="Active"), context_object=self.context1)
+        self.scheduled = Curation.objects.create(
+            content_object=TestContent.objects.create(name="Scheduled"), start=now + datetime.timedelta(days=1))
+        self.expired = Curation.objects.create(
+            content_object=TestContent.objects.create(name="Expired"), end=now - datetime.timedelta(days=1))
+
+    def tearDown(self):
+        TestContent.objects.all().delete()
+        Curation.objects.all().delete()
+        TestContextTarget.objects.all().delete()
+
+    def _changelist(self, **params):
+        request = RequestFactory().get('/', params)
+        m = self.model_admin
+        return ChangeList(request, Curation, m.list_display, m.list_display_links, m.list_filter,
+                          m.date_hierarchy, m.search_fields, m.list_select_related, m.list_per_page,
+                          m.list_max_show_all, m.list_editable, m)
+
+    def _render(self):
+        """
+        Returns the values displayed by the changelist and the number of
+        queries made to display them
+        """
+        use_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            changelist = self._changelist()
+            rows = [[lookup_field(name, obj, self.model_admin)[2] for name in changelist.list_display]
+                    for obj in changelist.result_list]
+            return rows, len(connection.queries) - start
+        finally:
+            connection.use_debug_cursor = use_debug_cursor
+
+    def test_status_filter(self):
+        for status, curation in (('active', self.active),
+                                 ('scheduled', self.scheduled),
+                                 ('expired', self.expired)):
+            self.assertEqual(list(self._changelist(status=status).result_list), [curation])
+
+    def test_changelist_queries(self):
+        self._render()
+        rows, queries = self._render()
+        # newest first
+        self.assertEqual(rows[2][:2], [self.active.content_object, self.context1])
+        self.assertEqual(rows[1][:2], [self.scheduled.content_object, None])
+
+        for i in range(10):
+            Curation.objects.create(
+                content_object=TestContent.objects.create(name="Test %s" % i), context_object=self.context1)
+        rows, more_queries = self._render()
+        self.assertEqual(len(rows), 13)
+        self.assertEqual(more_queries, queries)
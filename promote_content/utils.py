@@ -0,0 +1,87 @@
+import calendar
+import datetime
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import class_prepared, post_delete
+from django.utils import timezone
+
+from .models import Curation
+
+
+_generic_relations = {}
+_content_types = {}
+
+
+def _find_generic_relation(model, target):
+    for gen_rel, _ in model._meta.get_m2m_with_model():
+        if gen_rel.rel.to == target:
+            return gen_rel
+
+
+def get_generic_relation(model, target=Curation):
+    """
+    Returns the generic relation from ``model`` to ``target``, resolving it
+    only once per model
+    """
+    try:
+        return _generic_relations[(model, target)]
+    except KeyError:
+        gen_rel = _generic_relations[(model, target)] = _find_generic_relation(model, target)
+        return gen_rel
+
+
+def get_content_type(model):
+    """
+    Returns the content type of a model class or instance from a map kept
+    warm for the life of the process
+    """
+    if not isinstance(model, type):
+        model = model.__class__
+    try:
+        return _content_types[model]
+    except KeyError:
+        content_type = _content_types[model] = ContentType.objects.get_for_model(model)
+        return content_type
+
+
+def get_now():
+    """
+    Returns the current time rounded down to PROMOTE_CONTENT_NOW_GRANULARITY
+    seconds, so that curated queries made within the same interval are
+    identical
+    """
+    now = timezone.now()
+    granularity = getattr(settings, 'PROMOTE_CONTENT_NOW_GRANULARITY', None)
+    if granularity:
+        # round the timestamp rather than the time of day, so that intervals
+        # that don't divide a day are aligned across midnight
+        timestamp = calendar.timegm(now.utctimetuple())
+        now -= datetime.timedelta(seconds=timestamp % granularity, microseconds=now.microsecond)
+    return now
+
+
+def warm_content_types(*models):
+    """
+    Preloads the content types of ``models`` with a single query
+    """
+    missing = [model for model in models if model not in _content_types]
+    if missing:
+        _content_types.update(ContentType.objects.get_for_models(*missing))
+
+
+def clear_content_types(sender, **kwargs):
+    _content_types.clear()
+
+post_delete.connect(clear_content_types, sender=ContentType)
+
+
+def prepare_generic_relation(sender, **kwargs):
+    """
+    Resolves the curation relation of each model as it is prepared
+    """
+    gen_rel = _find_generic_relation(sender, Curation)
+    if gen_rel is not None:
+        _generic_relations[(sender, Curation)] = gen_rel
+
+class_prepared.connect(prepare_generic_relation)